@@ -0,0 +1,357 @@
+"""Equivalence checks and benchmarks of the zonal statistics kernels
+
+They compare the lookup table classification and the columnar parsing of
+the reduction results with the original implementations. They aren't part
+of the application, run them from the repository root:
+
+    python -m benchmarks.zonal_statistics
+"""
+
+import itertools
+import json
+import time
+
+import ee
+import numpy as np
+import pandas as pd
+
+import component.parameter as param
+from component.scripts import (
+    classify,
+    classify_lut,
+    get_gfc_image,
+    read_reduction,
+)
+
+# Classes of the chained where of get_where_image by (forest, gain), for a loss
+# year that is null, before, within and after the years span. "year" stands
+# for the loss year itself.
+WHERE_TABLE = {
+    (0, 0): (30, 30, 30, 30),
+    (0, 1): (50, 50, 50, 50),
+    (1, 0): (40, 30, "year", 40),
+    (1, 1): (50, 30, 51, 40),
+}
+
+
+def timeit(function, repeat):
+    """Return the result and the best duration (seconds) of repeated calls"""
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+
+    return result, min(durations)
+
+
+def get_where_classes(treecov, lossy, gain, thres, iniy, stopy):
+    """Return the classes of the pixels read from WHERE_TABLE"""
+
+    treecov, lossy, gain = np.broadcast_arrays(treecov, lossy, gain)
+
+    forest = (treecov > thres).astype(int)
+    position = np.select(
+        [lossy == 0, lossy < iniy, lossy <= stopy], [0, 1, 2], default=3
+    )
+
+    out = np.zeros(treecov.shape, dtype=np.int64)
+    for (f, g), classes in WHERE_TABLE.items():
+        for i, value in enumerate(classes):
+            pixels = (forest == f) & (gain == g) & (position == i)
+            out[pixels] = lossy[pixels] if value == "year" else value
+
+    return out
+
+
+def check_classification(thresholds=(0, 30, 80, 100)):
+    """Return the number of pixels classified differently from WHERE_TABLE by
+    the reference classify and by classify_lut
+
+    Every (tree cover, loss year, gain) combination is checked for the given
+    thresholds and every years span of the GFC dataset, 2000 included.
+    """
+
+    treecov, lossy, gain = np.meshgrid(
+        np.arange(101), np.arange(param.hist_lossy_size), np.arange(2), indexing="ij"
+    )
+
+    spans = itertools.combinations_with_replacement(param.year_range, 2)
+
+    different = {"classify": 0, "classify_lut": 0}
+    for (iniy, stopy), thres in itertools.product(spans, thresholds):
+
+        args = (treecov, lossy, gain, thres, iniy, stopy)
+        expected = get_where_classes(*args)
+
+        for function in [classify, classify_lut]:
+            different[function.__name__] += int(
+                np.count_nonzero(function(*args) != expected)
+            )
+
+    return different
+
+
+def benchmark_classification(
+    shape=(2048, 2048), thres=80, years=(2010, 2020), repeat=5
+):
+    """Compare the throughput of classify_lut and of the reference classify on
+    random GFC pixels
+
+    Returns:
+        dict: best durations (seconds), throughputs (pixels per second) and
+            whether both classifications are equal
+    """
+
+    rng = np.random.default_rng(0)
+    treecov = rng.integers(0, 101, shape, dtype=np.uint8)
+    lossy = rng.integers(0, max(param.year_range) + 1, shape, dtype=np.uint8)
+    gain = rng.integers(0, 2, shape, dtype=np.uint8)
+
+    args = (treecov, lossy, gain, thres, years[0] - 2000, years[1] - 2000)
+
+    reference, where_time = timeit(lambda: classify(*args), repeat)
+    result, lut_time = timeit(lambda: classify_lut(*args), repeat)
+
+    return {
+        "pixels": treecov.size,
+        "where": where_time,
+        "lut": lut_time,
+        "where_throughput": treecov.size / where_time,
+        "lut_throughput": treecov.size / lut_time,
+        "speedup": where_time / lut_time,
+        "equal": bool(np.array_equal(reference, result)),
+    }
+
+
+def get_where_image(aoi, thres, years):
+    """Return the forest change class image built with chained where
+
+    Reference implementation of get_gfc_image, used to check it.
+    """
+
+    iniy_ = years[0] - 2000
+    stopy_ = years[1] - 2000
+
+    gfc = ee.Image(param.gfc_dataset).clip(aoi)
+
+    treecov = gfc.select(["treecover2000"])
+    lossy = gfc.select(["lossyear"]).unmask(0)
+    gain = gfc.select(["gain"])
+
+    forest_change = (
+        ee.Image(0)
+        .where(treecov.lte(thres).And(gain.eq(1)), 50)  # gain V
+        .where(treecov.lte(thres).And(gain.eq(0)), 30)  # non-forest
+        .where(
+            treecov.gt(thres).And(lossy.lt(iniy_)), 30
+        )  # non-forest (lost forest before start date)
+        .where(
+            treecov.gt(thres).And(lossy.gt(stopy_)), 40
+        )  # stable forest (forest lost after the dates)
+        .where(
+            treecov.gt(thres)
+            .And(gain.eq(1))
+            .And(lossy.gte(iniy_))
+            .And(lossy.lte(stopy_)),
+            51,
+        )  # gain+loss
+        .where(treecov.gt(thres).And(gain.eq(1)).And(lossy.eq(0)), 50)  # gain
+        .where(
+            treecov.gt(thres)
+            .And(gain.eq(0))
+            .And(lossy.gte(iniy_))
+            .And(lossy.lte(stopy_)),
+            lossy,
+        )  # loss
+        .where(treecov.gt(thres).And(gain.eq(0)).And(lossy.eq(0)), 40)  # stable forest
+        .selfMask()
+    )
+
+    return forest_change
+
+
+def check_gfc_images(aoi, thres=80, years=(2010, 2020), scale=None, repeat=1):
+    """Compare the Earth Engine lookup table and chained where class images
+
+    Both images are reduced as class histograms over the aoi, which gives the
+    computation time of each of them, and the pixels of different classes
+    (masked ones included) are counted.
+
+    Args:
+        aoi (ee.Geometry): area of the comparison, small enough for reduceRegion
+        thres (int): minimum tree cover of a forest pixel
+        years (list): first and last years of the analysis
+        scale (float, optional): reduction scale, native GFC one if None
+        repeat (int): number of reductions of every image
+
+    Returns:
+        dict: number of different pixels and best durations (seconds)
+    """
+
+    scale = scale or ee.Image(param.gfc_dataset).projection().nominalScale()
+    reference = get_where_image(aoi, thres, years)
+    image = get_gfc_image(aoi, thres, years)
+
+    def histogram(image):
+        return image.reduceRegion(
+            ee.Reducer.frequencyHistogram(), aoi, scale, maxPixels=1e13
+        ).getInfo()
+
+    _, where_time = timeit(lambda: histogram(reference), repeat)
+    _, lut_time = timeit(lambda: histogram(image), repeat)
+
+    different = (
+        reference.unmask(0)
+        .neq(image.unmask(0))
+        .reduceRegion(ee.Reducer.sum(), aoi, scale, maxPixels=1e13)
+        .values()
+        .get(0)
+        .getInfo()
+    )
+
+    return {"different": different, "where": where_time, "lut": lut_time}
+
+
+def reduction_to_frame(result):
+    """Return the long dataframe (basin, variable, area, group, year) of a
+    reduction result grouped by class
+
+    Every basin has a row for every class found in the result (area NaN when
+    the basin doesn't have it), variable by variable in their order of
+    appearance. Basins without any group are dropped. Groups and years are
+    mapped once per class.
+
+    Args:
+        result (dict|str|Path|file): see read_reduction
+    """
+
+    hybas_ids, basins, codes, areas = read_reduction(result)
+
+    # feature indices are sorted, classes are kept in order of appearance
+    basin_ids, basin_rows = np.unique(basins, return_inverse=True)
+    variables, first, class_cols = np.unique(
+        codes, return_index=True, return_inverse=True
+    )
+    class_order = np.argsort(first)
+
+    matrix = np.full((len(basin_ids), len(variables)), np.nan)
+    matrix[basin_rows, class_cols] = areas
+    matrix = matrix[:, class_order]
+    variables = variables[class_order]
+
+    # labels are built once per basin and per class, then repeated
+    basin_labels = pd.Series(hybas_ids[basin_ids]).astype(str)
+    group_labels = pd.Series(
+        [param.gfc_translation[variable] for variable in variables], dtype=str
+    )
+
+    rows = np.arange(len(basin_ids))
+    cols = np.arange(len(variables))
+
+    df = pd.DataFrame(
+        {
+            "basin": basin_labels.take(np.tile(rows, len(cols))).array,
+            "variable": np.repeat(variables, len(rows)).astype(int),
+            "area": matrix.T.ravel(),
+            "group": group_labels.take(np.repeat(cols, len(rows))).array,
+        }
+    )
+
+    # Create a year label and set 0 to everything is not forest-loss
+    df["year"] = np.where(
+        df.variable <= param.gfc_max_year, df.variable + 2000, 0
+    ).astype(int)
+
+    return df
+
+
+def dict_to_frame(result):
+    """Reference parsing of a reduction result: dict of dicts, melt and per
+    row group and year, see reduction_to_frame"""
+
+    hybas_stats = {}
+    for feature in result["features"]:
+
+        hybas_id = feature["properties"]["HYBAS_ID"]
+
+        groups = feature["properties"]["groups"]
+        zonal_stats = {group["group"]: group["sum"] for group in groups}
+
+        hybas_stats[hybas_id] = zonal_stats
+
+    df = (
+        pd.melt(pd.DataFrame.from_dict(hybas_stats, "index"), ignore_index=False)
+        .reset_index()
+        .rename(columns={"index": "basin", "value": "area"})
+    )
+
+    df["basin"] = df.basin.astype(str)
+    df["variable"] = df.variable.astype(int)
+    df["group"] = df["variable"].apply(lambda x: param.gfc_translation[x])
+    df["year"] = df["variable"].apply(lambda x: x + 2000 if x <= 20 else 0).astype(int)
+
+    return df
+
+
+def benchmark_dataframe(n_basins=5000, n_classes=25, repeat=3):
+    """Compare the columnar parsing of a reduction result (dict and JSON
+    text) with the reference dict of dicts one, on a random result
+
+    Returns:
+        dict: best durations (seconds), "load" being the json.loads of the
+            text, and whether the dataframes are equal
+    """
+
+    rng = np.random.default_rng(0)
+    classes = np.array(param.gfc_classes)
+
+    result = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {
+                    "HYBAS_ID": 1000000000 + i,
+                    "groups": [
+                        {"group": int(group), "sum": float(rng.random() * 100)}
+                        for group in np.sort(
+                            rng.choice(classes, n_classes, replace=False)
+                        )
+                    ],
+                },
+            }
+            for i in range(n_basins)
+        ],
+    }
+    text = json.dumps(result)
+
+    def sort(df):
+        # the row order of the basins in a class isn't meaningful
+        return df.sort_values(["variable", "basin"]).reset_index(drop=True)
+
+    reference, dict_time = timeit(lambda: dict_to_frame(result), repeat)
+    df, columnar_time = timeit(lambda: reduction_to_frame(result), repeat)
+    parsed, text_time = timeit(lambda: reduction_to_frame(text), repeat)
+
+    # the text parsing includes the JSON decoding
+    _, load_time = timeit(lambda: json.loads(text), repeat)
+
+    return {
+        "rows": len(reference),
+        "dict": dict_time,
+        "columnar": columnar_time,
+        "text": text_time,
+        "load": load_time,
+        "speedup": dict_time / columnar_time,
+        "equal": sort(reference).equals(sort(df))
+        and sort(reference).equals(sort(parsed)),
+    }
+
+
+if __name__ == "__main__":
+
+    print("classification", check_classification())
+    print("classification benchmark", benchmark_classification())
+    print("dataframe benchmark", benchmark_dataframe())
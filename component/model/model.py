@@ -1,18 +1,19 @@
 import numpy as np
-import pandas as pd
 import seaborn as sns
 import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from traitlets import Int, List, Bool, CFloat, Unicode
+from traitlets import Int, List, Bool, CFloat, Unicode, Enum
 
 from sepal_ui.model import Model
 
-import component.parameter.app as cp
 import component.scripts as cs
 import component.parameter as param
 
 import ee
 import json
+import shapely
 from geopandas import GeoDataFrame
 
 
@@ -27,6 +28,9 @@ class BasinModel(Model):
     level = Int(8).tag(sync=True)
     "int: target level of the catchment"
 
+    engine = Enum(param.upstream_engines, "server").tag(sync=True)
+    "str: upstream traversal engine (server - rounds - local)"
+
     method = Unicode("").tag(sync=True)
     "Unicode: Selection basin id method (all - filter)"
 
@@ -45,9 +49,27 @@ class BasinModel(Model):
     # Statistics
     ready = Bool(False).tag(sync=True)
 
+    stats_mode = Enum(param.stats_modes, "direct").tag(sync=True)
+    "str: statistics reduction (direct - histogram), see cs.classify_histograms"
+
+    stats_backend = Enum(param.stats_backends, "ee").tag(sync=True)
+    "str: zonal statistics backend (ee - local), local reads the GFC tiles"
+
+    stats_progressive = Bool(False).tag(sync=True)
+    "bool: whether to display coarse statistics before the native ones"
+
+    stats_stage = Unicode("").tag(sync=True)
+    "str: resolution of the current zonal_df (preview - final)"
+
+    stats_status = Unicode("").tag(sync=True)
+    "str: state of the statistics computation (running - exporting - refining - done - error)"
+
     sett_timespan = List([2010, 2020]).tag(sync=True)
     "list: user selected span of time in the statistics settings panel"
 
+    sett_upstream = Bool(False).tag(sync=True)
+    "bool: whether to display the statistics accumulated over the upstream catchments"
+
     selected_var = Unicode("").tag(sync=True)
     "str: current selected variable from pie chart or variable selector widget"
 
@@ -65,7 +87,34 @@ class BasinModel(Model):
             forest_change (ee.Image): forest change mas within the given upstream
                 catchments at the given livel using the base basin.
             data (dict): upstream catchments in a geojson format
-            zonal_df (df): Zonal statistics dataframe
+            store (CatchmentStore): indexed GeoDataFrame of the data
+            exact_store (CatchmentStore): indexed GeoDataFrame of the full
+                resolution geometries, loaded for the local statistics
+            geojsons (dict): upstream catchments in a geojson format by
+                simplification tolerance (meters), 0 being the full resolution
+            stats (ZonalStats): zonal statistics of every catchment by class
+            upstream_stats (ZonalStats): stats accumulated over every upstream
+                catchment, None when the statistics don't include all the
+                upstream catchments of their basins (see has_upstream_closure)
+            upstream_complete (bool): whether the upstream_stats are available
+            stats_level (int): HydroBASINS level of the statistics basins
+            catch_colors (dict): color of every catchment by HYBAS_ID, reset
+                with every delineation
+            outlet (dict): coordinates, level and HYBAS_ID(s) of the last
+                delineated outlet basin
+            upstream_cache (LRUCache): upstream catchments ids by outlet basin
+            task_runner (EETaskRunner): runner of the statistics export tasks
+            poller (ExportPoller): poller of the last statistics export
+            stats_error (Exception): error of the last failed statistics export
+            stats_cache (LRUCache): statistics of every catchment by inputs
+            histograms (dict): reduction grouped by (tree cover, loss year,
+                gain) code of the last "histogram" statistics
+            stats_run (int): number of the last statistics computation, the
+                results of the previous ones are dropped
+            stats_executor (ThreadPoolExecutor): runs the native statistics
+                reduction after the preview
+            derived (LRUCache): memoized views of the statistics by name and
+                dashboard traits, cleared with the statistics and on ready
         """
 
         self.base_basin = None
@@ -75,8 +124,43 @@ class BasinModel(Model):
         self.lat_link = False
         self.lon_link = False
 
+        self.store = None
         self.data = None
-        self.zonal_df = None
+        self.geojsons = {}
+        self.exact_store = None
+        self.stats = None
+        self.upstream_stats = None
+        self.upstream_complete = False
+        self.stats_level = None
+        self.catch_colors = {}
+        self._frames = {}
+
+        self.outlet = None
+        self.upstream_cache = cs.LRUCache("upstream", *param.upstream_cache_size)
+
+        self.task_runner = cs.EETaskRunner()
+        self.poller = None
+        self.stats_error = None
+        self.stats_cache = cs.LRUCache("statistics", *param.stats_cache_size)
+        self.histograms = None
+        self.stats_run = 0
+        self.stats_executor = ThreadPoolExecutor(max_workers=1)
+        self.derived = cs.LRUCache("derived", param.derived_cache_size, 0)
+
+        self.observe(self.update_histogram_statistics, ["years", "thres"])
+        self.observe(lambda _: self.derived.clear(), "ready")
+
+    @property
+    def data(self):
+        """dict: upstream catchments in a geojson format"""
+
+        return self._data
+
+    @data.setter
+    def data(self, data):
+
+        self._data = data
+        self.store = cs.CatchmentStore(data) if data else None
 
     def get_upstream_basin_ids(self, geometry, max_steps=100):
         """Return a list with all uperstream catchments ids from the base basin
@@ -87,7 +171,57 @@ class BasinModel(Model):
 
         Params:
             level (int): WWF catchment level to query the inputs
+            engine (str): "server" iterates max_steps times over the collection
+                in Earth Engine, "rounds" expands the frontier from the client
+                until it is empty and "local" only queries the outlet basin
+                and walks the cached NEXT_DOWN topology of the level.
+
+        The outlet basin is always resolved first, results are cached by
+        dataset, level, outlet HYBAS_ID(s) and engine in memory and on disk.
+        """
+
+        self.reset_statistics()
+        self.base_basin = cs.get_hydroshed(level=self.level)
+
+        # identical outlet basins always have the same upstream catchments, the
+        # "server" engine ones being truncated at max_steps
+        outlet_ids = self.get_outlet_ids(geometry)
+        cache_key = [
+            param.hybas_dataset.format(self.level),
+            self.level,
+            outlet_ids,
+            self.engine,
+            max_steps if self.engine == "server" else None,
+        ]
+
+        hybasin_list = self.upstream_cache.get(cache_key)
+
+        if hybasin_list is None:
+
+            outlets = self.base_basin.filter(ee.Filter.inList("HYBAS_ID", outlet_ids))
+
+            if self.engine == "local":
+                hybasin_list = cs.get_topology(self.level).upstream(outlet_ids)
 
+            elif self.engine == "rounds":
+                levels = cs.get_upstream_levels(self.base_basin, outlets)
+                hybasin_list = [row[0] for level in levels for row in level]
+
+            else:
+                hybasin_list = self.iterate_upstream(outlets, max_steps)
+
+            self.upstream_cache.set(cache_key, hybasin_list)
+
+        self.geojsons = {}
+        self.exact_store = None
+        self.hybasin_list = hybasin_list
+
+    def iterate_upstream(self, outlets, max_steps=100):
+        """Return the upstream catchments ids iterating in Earth Engine
+
+        Args:
+            outlets (ee.FeatureCollection): outlet basin(s) from the base basin
+            max_steps (int) : Arbritrary number to loop over the collection
         """
 
         def get_upper(i, acc):
@@ -108,13 +242,9 @@ class BasinModel(Model):
             # and append them into the feature collection (to start again)
             return acc.add(upper_catchments)
 
-        self.base_basin = cs.get_hydroshed(level=self.level)
-
         upstream_catchs = ee.FeatureCollection(
             ee.List(
-                ee.List.sequence(1, max_steps).iterate(
-                    get_upper, [self.base_basin.filterBounds(geometry)]
-                )
+                ee.List.sequence(1, max_steps).iterate(get_upper, [outlets])
             ).iterate(
                 lambda fc, acc: ee.FeatureCollection(acc).merge(
                     ee.FeatureCollection(fc)
@@ -123,64 +253,130 @@ class BasinModel(Model):
             )
         )
 
-        self.hybasin_list = upstream_catchs.aggregate_array("HYBAS_ID").getInfo()
+        return upstream_catchs.aggregate_array("HYBAS_ID").getInfo()
+
+    def get_upstream_basin_ids_batch(self, outlets):
+        """Return the upstream catchments ids of many outlets at the current level
+
+        Args:
+            outlets (list): (lat, lon) coordinates of the outlets
+
+        Returns:
+            list: HYBAS_ID list of the upstream catchments of every outlet
+        """
+
+        return cs.delineate_outlets(outlets, self.level, self.engine)
+
+    def get_outlet_ids(self, geometry):
+        """Return the HYBAS_ID(s) of the basin(s) containing the geometry
+
+        When the point falls inside the loaded catchments of the same level,
+        the outlet is resolved locally in the catchment store (only when the
+        point is further than the simplification tolerance from their borders).
+        When the same point has already been delineated at another level, the
+        HydroBASINS hierarchy of the local engine is used instead of a spatial
+        query: the coarser
+        outlet is the parent of the previous one, the finer outlet is searched
+        only among the children of the previous one.
+
+        Args:
+            geometry (ee.Geometry): geometry to filter the base catchment level
+        """
+
+        coords, previous = (self.lat, self.lon), self.outlet
+
+        local_id = None
+        if self.store is not None and previous and previous["level"] == self.level:
+            buffer = max(param.simplify_tolerances) / param.degree_size
+            local_id = self.store.at(self.lon, self.lat, buffer)
+
+        if local_id is not None:
+            outlet_ids = [local_id]
+
+        elif self.engine == "local" and previous and previous["coords"] == coords:
+
+            candidates = cs.get_hierarchy().rescale(
+                previous["hybas_ids"], previous["level"], self.level
+            )
+
+            if self.level <= previous["level"]:
+                outlet_ids = candidates
+
+            else:
+                outlet_ids = (
+                    self.base_basin.filter(ee.Filter.inList("HYBAS_ID", candidates))
+                    .filterBounds(geometry)
+                    .aggregate_array("HYBAS_ID")
+                    .getInfo()
+                )
+        else:
+            outlet_ids = (
+                self.base_basin.filterBounds(geometry)
+                .aggregate_array("HYBAS_ID")
+                .getInfo()
+            )
+
+        self.outlet = {"coords": coords, "level": self.level, "hybas_ids": outlet_ids}
+
+        return outlet_ids
 
     def get_upstream_fc(self):
         """Filter and get upstream catchments"""
 
         return self.get_selected(self.hybasin_list)
 
+    def get_geojson(self, tolerance=0):
+        """Return the upstream catchments as geojson, simplified in Earth Engine
+
+        Every simplification level is downloaded once per delineation.
+
+        Args:
+            tolerance (int): maximum simplification error in meters, 0 for the
+                full resolution geometries
+        """
+
+        if tolerance not in self.geojsons:
+
+            upstream_catch = self.get_upstream_fc()
+
+            if tolerance:
+                upstream_catch = upstream_catch.map(
+                    lambda feature: feature.simplify(maxError=tolerance)
+                )
+
+            self.geojsons[tolerance] = upstream_catch.getInfo()
+
+        return self.geojsons[tolerance]
+
+    def get_aoi(self, tolerance=0):
+        """Return the dissolved outline of the loaded catchments as ee.Geometry
+
+        The outline is computed locally from the catchment store, so Earth
+        Engine receives a single simplified polygon instead of the union of
+        all the catchments.
+
+        Args:
+            tolerance (int): simplification error (meters) of the loaded
+                geometries, the outline is buffered by it to cover them
+        """
+
+        outline = self.store.outline(tolerance / param.degree_size)
+
+        return ee.Geometry(json.loads(shapely.to_geojson(outline)), None, False)
+
     def get_gfc(self, aoi):
         """Creates a forest change map based on gfw dataset
 
+        The classes are remapped from a single packed code of every pixel, see
+        cs.get_gfc_image.
+
         Params:
             aoi (ee.Geometry): area of interest to clip the change mask
-            iniy (int): the initial year of the analysis
-            stpoy (int): end year for the loss
+            years (list): the initial and end years of the loss
             thres (int): minimum value for the tree cover
         """
 
-        iniy_ = self.years[0] - 2000
-        stopy_ = self.years[1] - 2000
-
-        gfc = ee.Image(cp.gfc_dataset).clip(aoi)
-
-        treecov = gfc.select(["treecover2000"])
-        lossy = gfc.select(["lossyear"]).unmask(0)
-        gain = gfc.select(["gain"])
-
-        forest_change = (
-            ee.Image(0)
-            .where(treecov.lte(self.thres).And(gain.eq(1)), 50)  # gain V
-            .where(treecov.lte(self.thres).And(gain.eq(0)), 30)  # non-forest
-            .where(
-                treecov.gt(self.thres).And(lossy.lt(iniy_)), 30
-            )  # non-forest (lost forest before start date)
-            .where(
-                treecov.gt(self.thres).And(lossy.gt(stopy_)), 40
-            )  # stable forest (forest lost after the dates)
-            .where(
-                treecov.gt(self.thres)
-                .And(gain.eq(1))
-                .And(lossy.gte(iniy_))
-                .And(lossy.lte(stopy_)),
-                51,
-            )  # gain+loss
-            .where(treecov.gt(self.thres).And(gain.eq(1)).And(lossy.eq(0)), 50)  # gain
-            .where(
-                treecov.gt(self.thres)
-                .And(gain.eq(0))
-                .And(lossy.gte(iniy_))
-                .And(lossy.lte(stopy_)),
-                lossy,
-            )  # loss
-            .where(
-                treecov.gt(self.thres).And(gain.eq(0)).And(lossy.eq(0)), 40
-            )  # stable forest
-            .selfMask()
-        )
-
-        return forest_change
+        return cs.get_gfc_image(aoi, self.thres, self.years)
 
     def get_selected(self, hybas_ids, from_json=False):
         """Return the selected Feature Collection or geojson dict
@@ -190,115 +386,619 @@ class BasinModel(Model):
         """
 
         if from_json:
-            gdf = GeoDataFrame.from_features(self.data["features"])
-            return json.loads(gdf[gdf["HYBAS_ID"].isin(hybas_ids)].to_json())
+            return self.store.to_geojson(hybas_ids)
 
         return self.base_basin.filter(ee.Filter.inList("HYBAS_ID", hybas_ids))
 
-    @staticmethod
-    def get_bounds(dataset):
-        """Get bounds of the given feature collection"""
+    def get_bounds(self, dataset):
+        """Get bounds of the given feature collection, geojson or HYBAS_ID list
+
+        The bounds of the loaded catchments and of HYBAS_ID lists are computed
+        locally from the per feature bounds of the store or, for basins that
+        are not loaded, from the cached bounds table of the current level.
+        """
+
+        if isinstance(dataset, list):
+
+            if self.store is not None and self.store.has(dataset):
+                return self.store.total_bounds(dataset)
+
+            return cs.get_basin_bounds(self.level, dataset)
+
+        elif isinstance(dataset, dict):
 
-        if isinstance(dataset, ee.FeatureCollection):
+            if self.store is not None and dataset is self.data:
+                return self.store.total_bounds()
+
+            return list(GeoDataFrame.from_features(dataset["features"]).total_bounds)
+
+        elif isinstance(dataset, ee.FeatureCollection):
 
             ee_bounds = dataset.geometry().bounds().coordinates()
             coords = ee_bounds.get(0).getInfo()
             ll, ur = coords[0], coords[2]
             return ll[0], ll[1], ur[0], ur[1]
 
-        elif isinstance(dataset, dict):
+    def get_statistics_ids(self):
+        """Return the HYBAS_ID(s) of the catchments to calculate statistics on"""
 
-            return list(GeoDataFrame.from_features(dataset["features"]).total_bounds)
+        if self.method == "filter" and not self.selected_hybas:
+            raise Exception("Please select a subcatchment.")
+
+        return self.selected_hybas if self.method != "all" else self.hybasin_list
+
+    def reset_statistics(self):
+        """Drop the statistics of the previous catchments
+
+        The run number is increased, so the exports and refinements still
+        running for them are ignored once done.
+        """
+
+        self.stats_run += 1
+        self.ready = False
+
+        self.poller = None
+        self.histograms = None
+        self.stats = None
+        self.upstream_stats = None
+        self.upstream_complete = False
+        self.catch_colors = {}
+        self._frames = {}
+        self.derived.clear()
+
+        self.stats_stage = ""
+        self.stats_status = ""
+
+    def get_stats_inputs(self):
+        """Return the inputs of a statistics computation
+
+        They are captured when the computation starts, so its results are
+        reduced, cached and displayed for these inputs even if the traits
+        change before a background reduction is done.
+        """
+
+        return {
+            "hybas_ids": list(self.get_statistics_ids()),
+            "years": list(self.years),
+            "thres": self.thres,
+            "mode": self.stats_mode,
+            "backend": self.stats_backend,
+            "level": self.level,
+            "collection": self.base_basin,
+        }
+
+    def compute_statistics(self):
+        """Compute the zonal statistics dataframe and set ready once it's done
+
+        Selections above the export thresholds (number of catchments or area)
+        are reduced by an export task polled in the background, smaller ones
+        interactively. In progressive mode, coarse statistics are displayed
+        first and refined at the native scale in the background.
+
+        Returns:
+            bool: whether the statistics are already available
+        """
+
+        self.ready = False
+        self.stats_run += 1
+
+        run, inputs = self.stats_run, self.get_stats_inputs()
+        hybas_ids = inputs["hybas_ids"]
+
+        features, missing = self.get_cached_statistics(hybas_ids, inputs)
+
+        if missing and self.use_export(missing, inputs):
+
+            def on_done(result):
+
+                # cached for its own inputs, even if it's not displayed anymore
+                features.update(self.cache_statistics(result, inputs))
+
+                # a new computation started in the meantime
+                if run != self.stats_run:
+                    return
+
+                self.set_statistics(self.merge_statistics(hybas_ids, features), inputs)
+
+            # polled in the background, unless there's no running event loop
+            self.submit_statistics(missing, inputs, on_done)
+            return self.ready
+
+        self.poller = None
+        self.stats_status = "running"
+
+        if self.stats_progressive and missing:
+            self.set_statistics(
+                self.calculate_statistics(inputs, param.preview_scale),
+                inputs,
+                "preview",
+            )
+            self.refine_statistics(inputs)
+
+        else:
+            self.set_statistics(self.calculate_statistics(inputs), inputs)
+
+        return True
+
+    def refine_statistics(self, inputs):
+        """Reduce the statistics at the native scale in a background thread and
+        swap them in, on the kernel event loop, once done. Without a running
+        event loop (i.e. in a script), they are swapped in right away.
+
+        Args:
+            inputs (dict): inputs of the preview, see get_stats_inputs
+        """
+
+        run, loop = self.stats_run, cs.get_running_loop()
+
+        def refine():
+
+            # a new computation or delineation (see reset_statistics) started
+            # while this one was waiting for the executor
+            if run != self.stats_run:
+                return None
+
+            return self.calculate_statistics(inputs)
+
+        def on_done(future):
+
+            # a new computation or delineation started in the meantime
+            if run != self.stats_run:
+                return
+
+            try:
+                result = future.result()
+            except Exception as e:
+                self.stats_error = e
+                self.stats_status = "error"
+                return
+
+            self.ready = False
+            self.set_statistics(result, inputs)
+
+        future = self.stats_executor.submit(refine)
+
+        # without a running event loop (i.e. in a script), wait for the result
+        if loop is None:
+            on_done(future)
+            return
 
-    def calculate_statistics(self):
+        future.add_done_callback(
+            lambda future: loop.call_soon_threadsafe(on_done, future)
+        )
+
+    def set_statistics(self, result, inputs, stage="final"):
+        """Parse a reduction result as the zonal dataframe and notify the dashboard
+
+        Args:
+            result (dict): reduction result
+            inputs (dict): inputs of the reduction, see get_stats_inputs
+            stage (str): "preview" for coarse statistics that will be refined,
+                "final" otherwise. It's set in zonal_df.attrs["stage"].
+        """
+
+        self.histograms = None
+
+        if inputs["mode"] == "histogram":
+            self.histograms = result
+            result = cs.classify_histograms(result, self.thres, self.years)
+
+        # the upstream statistics of a partial selection would be truncated
+        self.upstream_complete = self.has_upstream_closure(
+            inputs["hybas_ids"], inputs["level"]
+        )
+        self.stats_level = inputs["level"]
+        if not self.upstream_complete:
+            self.sett_upstream = False
+
+        self.stats_stage = stage
+        self.set_stats(result)
+        self.stats_status = "refining" if stage == "preview" else "done"
+
+        # Graphs dashboard is listening this trait to load its data
+        self.ready = True
+
+    def update_histogram_statistics(self, change):
+        """Classify the last histograms again when the years or threshold change,
+        without any new reduction"""
+
+        if self.histograms is None:
+            return
+
+        self.ready = False
+        self.set_stats(cs.classify_histograms(self.histograms, self.thres, self.years))
+        self.ready = True
+
+    def set_stats(self, result):
+        """Set the statistics of a reduction result grouped by class and their
+        upstream accumulation
+
+        The per basin class areas are summed along the NEXT_DOWN tree of the
+        computed basins in a single pass, without any Earth Engine request,
+        only when they include all their upstream catchments.
+        """
+
+        stats = cs.ZonalStats.from_reduction(result, self.get_catch_colors)
+        upstream_stats = None
+
+        if self.upstream_complete:
+            upstream_stats = stats.accumulate(
+                self.get_next_down(stats.hybas_ids, self.stats_level)
+            )
+
+        self.stats, self.upstream_stats = stats, upstream_stats
+        self._frames = {}
+        self.derived.clear()
+
+    @property
+    def zonal_df(self):
+        """df: Zonal statistics dataframe, built on demand (i.e. export)"""
+
+        return self.get_frame("zonal", self.stats)
+
+    @property
+    def upstream_df(self):
+        """df: zonal_df with the areas accumulated over every upstream catchment"""
+
+        return self.get_frame("upstream", self.upstream_stats)
+
+    def get_frame(self, name, stats):
+        """Return the (cached) long dataframe of the statistics, flagged with
+        their stage in attrs["stage"]"""
+
+        if stats is None:
+            return None
+
+        if name not in self._frames:
+            self._frames[name] = stats.to_frame()
+            self._frames[name].attrs["stage"] = self.stats_stage
+
+        return self._frames[name]
+
+    def has_upstream_closure(self, hybas_ids, level=None):
+        """Return whether the catchments include all their upstream catchments,
+        i.e. all the upstream ones ("all" method) or a selection of headwaters
+
+        Catchments out of the current upstream ones (hybasin_list) never do.
+        """
+
+        upstream = np.asarray(self.hybasin_list, dtype=np.int64)
+
+        if not np.isin(hybas_ids, upstream).all():
+            return False
+
+        inflow = np.isin(self.get_next_down(upstream, level), hybas_ids)
+
+        return bool(np.isin(upstream[inflow], hybas_ids).all())
+
+    def get_next_down(self, hybas_ids, level=None):
+        """Return the NEXT_DOWN of the given catchments, from the loaded ones or
+        from the topology table of their level (the current one if None)"""
+
+        if self.store is not None and self.store.has(hybas_ids):
+            return self.store.gdf.loc[hybas_ids, "NEXT_DOWN"].to_numpy()
+
+        topology = cs.get_topology(self.level if level is None else level)
+
+        return topology.next_down[topology.rows(hybas_ids)]
+
+    def use_export(self, hybas_ids, inputs):
+        """Return whether the catchments are too large for an interactive reduction"""
+
+        # local reductions have no interactive limits
+        if inputs["backend"] == "local":
+            return False
+
+        areas = self.get_areas(hybas_ids) or [0]
+
+        return (
+            len(hybas_ids) > param.export_feature_threshold
+            or sum(areas) > param.export_area_threshold
+        )
+
+    def submit_statistics(self, hybas_ids, inputs, on_done):
+        """Reduce the catchments as an export task and poll it until it's done
+
+        Args:
+            hybas_ids (list): hydrobasin id's to reduce
+            inputs (dict): inputs of the reduction, see get_stats_inputs
+            on_done (callable): function called with the reduction result
+        """
+
+        run = self.stats_run
+
+        def on_error(error):
+
+            if run != self.stats_run:
+                return
+
+            self.stats_error = error
+            self.stats_status = "error"
+
+        handle = self.task_runner.submit(
+            self.get_reduction(hybas_ids, inputs),
+            f"basin_rivers_statistics_{int(time.time())}",
+        )
+
+        self.stats_status = "exporting"
+        self.poller = cs.ExportPoller(
+            self.task_runner, handle, on_done, on_error
+        ).start()
+
+    def calculate_statistics(self, inputs, scale=None):
         """Get hydrobasin id statistics on the given hybasin_id
 
-        hybas_ids (list): hydrobasin id's to calculate statistics.
+        Only the catchments missing from the statistics cache are reduced, by
+        batches balanced by number of features and area, concurrently (see
+        cs.reduce_chunks), or from the local GFC tiles with the "local"
+        backend (see cs.reduce_local).
+
+        Args:
+            inputs (dict): inputs of the reduction, see get_stats_inputs
+            scale (float, optional): reduction scale, native GFC one if None
 
         """
 
-        if self.method == "filter" and not self.selected_hybas:
-            raise Exception("Please select a subcatchment.")
+        hybas_ids = inputs["hybas_ids"]
 
-        feature_collection = self.base_basin.filter(
-            ee.Filter.inList(
-                "HYBAS_ID",
-                self.selected_hybas if self.method != "all" else self.hybasin_list,
+        features, missing = self.get_cached_statistics(hybas_ids, inputs, scale)
+
+        if missing and inputs["backend"] == "local":
+            result = self.reduce_local(missing, inputs, scale)
+            features.update(self.cache_statistics(result, inputs, scale))
+
+        elif missing:
+            result = cs.reduce_chunks(
+                missing,
+                lambda ids: self.reduce_regions(ids, inputs, scale),
+                areas=self.get_areas(missing),
             )
+            features.update(self.cache_statistics(result, inputs, scale))
+
+        return self.merge_statistics(hybas_ids, features)
+
+    @staticmethod
+    def get_stats_key(hybas_id, inputs, scale=None):
+        """Return the statistics cache key of a catchment for the given inputs"""
+
+        # histograms don't depend on the years and threshold
+        if inputs["mode"] == "histogram":
+            parameters = ["histogram"]
+        else:
+            parameters = [list(inputs["years"]), inputs["thres"]]
+
+        return [
+            param.gfc_dataset,
+            inputs["backend"],
+            inputs["level"],
+            hybas_id,
+            *parameters,
+            scale or "native",
+        ]
+
+    def get_cached_statistics(self, hybas_ids, inputs, scale=None):
+        """Return the cached statistics features by HYBAS_ID and the missing ids"""
+
+        features, missing = {}, []
+
+        cached = self.stats_cache.get_many(
+            [self.get_stats_key(hybas_id, inputs, scale) for hybas_id in hybas_ids]
+        )
+
+        for hybas_id, feature in zip(hybas_ids, cached):
+            if feature is None:
+                missing.append(hybas_id)
+            else:
+                features[hybas_id] = feature
+
+        return features, missing
+
+    def cache_statistics(self, result, inputs, scale=None):
+        """Cache the statistics of every reduced catchment, without geometry
+
+        Returns:
+            dict: statistics features by HYBAS_ID
+        """
+
+        features = {}
+
+        for feature in result["features"]:
+
+            properties = feature["properties"]
+            hybas_id = properties["HYBAS_ID"]
+            features[hybas_id] = {
+                "type": "Feature",
+                "properties": {"HYBAS_ID": hybas_id, "groups": properties["groups"]},
+            }
+
+        self.stats_cache.set_many(
+            (self.get_stats_key(hybas_id, inputs, scale), feature)
+            for hybas_id, feature in features.items()
         )
 
+        return features
+
+    @staticmethod
+    def merge_statistics(hybas_ids, features):
+        """Return the statistics features of the catchments as a reduction result"""
+
+        return {
+            "type": "FeatureCollection",
+            "features": [features[i] for i in hybas_ids if i in features],
+        }
+
+    def get_reduction(self, hybas_ids, inputs, scale=None):
+        """Return the grouped reduction of the forest change area (ha) by class,
+        or by histogram code in "histogram" statistics mode
+
+        Args:
+            hybas_ids (list): hydrobasin id's to reduce
+            inputs (dict): inputs of the reduction, see get_stats_inputs
+            scale (float, optional): reduction scale, native GFC one if None
+        """
+
+        feature_collection = inputs["collection"].filter(
+            ee.Filter.inList("HYBAS_ID", hybas_ids)
+        )
+
+        if inputs["mode"] == "histogram":
+            image = cs.get_histogram_image(feature_collection)
+        else:
+            image = cs.get_gfc_image(
+                feature_collection, inputs["thres"], inputs["years"]
+            )
+
         return (
             ee.Image.pixelArea()
             .divide(10000)
-            .addBands(self.get_gfc(feature_collection))
+            .addBands(image)
             .reduceRegions(
                 collection=feature_collection,
                 reducer=ee.Reducer.sum().group(1),
-                scale=ee.Image(param.gfc_dataset).projection().nominalScale(),
+                scale=scale or ee.Image(param.gfc_dataset).projection().nominalScale(),
             )
-        ).getInfo()
+        )
 
-    @staticmethod
-    def get_dataframe(result):
-        """parse reduce region result as Pandas Dataframe
+    def reduce_regions(self, hybas_ids, inputs, scale=None):
+        """Return the forest change area (ha) by class of the given catchments
 
         Args:
-            result (list): reduce region dictionary
+            hybas_ids (list): hydrobasin id's to reduce
+            inputs (dict): inputs of the reduction, see get_stats_inputs
+            scale (float, optional): reduction scale, native GFC one if None
         """
 
-        hybas_stats = {}
-        for feature in result["features"]:
+        return self.get_reduction(hybas_ids, inputs, scale).getInfo()
 
-            hybas_id = feature["properties"]["HYBAS_ID"]
+    def reduce_local(self, hybas_ids, inputs, scale=None):
+        """Return the forest change area (ha) by class of the given catchments,
+        reduced from the local GFC tiles
 
-            groups = feature["properties"]["groups"]
-            zonal_stats = {group["group"]: group["sum"] for group in groups}
+        The full resolution geometries are used, never the simplified ones
+        displayed on the map (see get_geojson).
 
-            hybas_stats[hybas_id] = zonal_stats
+        Args:
+            hybas_ids (list): hydrobasin id's to reduce, from the upstream
+                catchments
+            inputs (dict): inputs of the reduction, see get_stats_inputs
+            scale (float, optional): reduction scale, native GFC one if None
+        """
 
-        df = (
-            pd.melt(
-                pd.DataFrame.from_dict(hybas_stats, "index")
-                # .rename(columns=param.gfc_names)
-                ,
-                ignore_index=False,
-            )
-            .reset_index()
-            .rename(columns={"index": "basin", "value": "area"})
-        )
+        if self.exact_store is None:
+            self.exact_store = cs.CatchmentStore(self.get_geojson(0))
 
-        # Prepare base dataframe
-        df["basin"] = df.basin.astype(str)
-        df["variable"] = df.variable.astype(int)
-        df["group"] = df["variable"].apply(lambda x: cp.gfc_translation[x])
+        if not self.exact_store.has(hybas_ids):
+            raise Exception("The catchments have to be loaded to reduce them locally.")
 
-        # Create a year label and set 0 to everything is not forest-loss
-        df["year"] = (
-            df["variable"].apply(lambda x: x + 2000 if x <= 20 else 0).astype(int)
-        )
+        histogram = inputs["mode"] == "histogram"
 
-        # Add a color for every catchment
-        color_palette = np.array(
-            sns.color_palette("hls", len(df.basin.unique())).as_hex()
+        return cs.reduce_local(
+            hybas_ids,
+            self.exact_store.gdf.geometry.loc[hybas_ids].tolist(),
+            thres=None if histogram else inputs["thres"],
+            years=None if histogram else inputs["years"],
+            scale=scale,
         )
 
+    def get_areas(self, hybas_ids):
+        """Return the area (km²) of the given catchments, None if not loaded"""
+
+        if self.store is None or not self.store.has(hybas_ids):
+            return None
+
+        return self.store.gdf.loc[hybas_ids, "SUB_AREA"].tolist()
+
+    def get_catch_colors(self, hybas_ids):
+        """Return the color of every catchment, kept by HYBAS_ID for the whole
+        delineation so the charts colors don't change with the statistics"""
+
+        missing = [i for i in dict.fromkeys(hybas_ids) if i not in self.catch_colors]
+        self.catch_colors.update(zip(missing, self.get_colors(len(missing))))
+
+        return [self.catch_colors[i] for i in hybas_ids]
+
+    @staticmethod
+    def get_colors(n):
+        """Return a shuffled color palette of n catchments"""
+
+        color_palette = sns.color_palette("hls", n).as_hex()
         random.shuffle(color_palette)
 
-        df["catch_color"] = color_palette[pd.factorize(df.basin)[0]]
+        return color_palette
+
+    def get_derived(self, name, compute, traits=()):
+        """Return a view of the statistics, memoized by name and by the values
+        of the traits it depends on
 
-        return df
+        Args:
+            name (str): name of the view
+            compute (callable): function computing the view
+            traits (list): name of the traits the view depends on
+        """
+
+        key = [name] + [getattr(self, trait) for trait in traits]
+        value = self.derived.get(key)
+
+        if value is None:
+            value = compute()
+            self.derived.set(key, value)
+
+        return value
+
+    def get_stats(self):
+        """Return the displayed statistics, accumulated upstream or not"""
+
+        if self.sett_upstream and self.upstream_stats is not None:
+            return self.upstream_stats
+
+        return self.stats
 
     def get_overall_pie_df(
         self,
     ):
         """Create a grouped dataframe to display overall pie statistics"""
 
-        grouped_df = self.zonal_df.groupby(["group"]).sum().reset_index()
-        grouped_df["color"] = grouped_df["group"].apply(
-            lambda x: param.gfc_colors_dict[x]
+        return self.get_derived("overall_pie", self.stats.group_totals)
+
+    def get_basin_df(self):
+        """Return the area of the selected variable (within the selected span
+        for the loss) and the color of every selected basin"""
+
+        var = self.selected_var
+        traits = ["sett_upstream", "selected_hybasid_chart", "selected_var"]
+
+        if var == "loss":
+            traits.append("sett_timespan")
+
+        return self.get_derived(
+            "basin",
+            lambda: self.get_stats().basin_totals(
+                self.selected_hybasid_chart,
+                None if var == "all" else var,
+                self.sett_timespan if var == "loss" else None,
+            ),
+            traits,
         )
 
-        return grouped_df
+    def get_trend_df(self):
+        """Return the loss area of every selected basin (rows) and year (columns)"""
+
+        return self.get_derived(
+            "trend",
+            lambda: self.get_stats().trend(
+                self.selected_hybasid_chart, self.sett_timespan
+            ),
+            ["sett_upstream", "selected_hybasid_chart", "sett_timespan"],
+        )
+
+    def get_basin_colors(self):
+        """Return the color of every selected basin by label"""
+
+        return self.get_derived(
+            "colors",
+            lambda: self.stats.colors(self.selected_hybasid_chart),
+            ["selected_hybasid_chart"],
+        )
 
     def get_bar_df(self):
 
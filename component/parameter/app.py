@@ -17,6 +17,9 @@ gfc_labels = [f"loss_{y+2000}" for y in year_range] + [
     "gain_loss",
 ]
 
+# Number of loss year values packed in the histogram codes (lossyear < 32)
+hist_lossy_size = 32
+
 gfc_str_code = []
 
 GFC = {}
@@ -31,9 +34,101 @@ year_items = [{"text": str(y + 2000), "value": y} for y in year_range]
 hybas_dataset = "WWF/HydroSHEDS/v1/Basins/hybas_{}"
 hybas_levels = list(range(5, 13))
 
+# HydroBASINS regions (first digit of the HYBAS_ID)
+hybas_regions = list(range(1, 10))
+
+# Upstream traversal engines
+upstream_engines = ["server", "rounds", "local"]
+
+# Number of levels expanded in every request of the "rounds" engine
+upstream_round_depth = 10
+
+# Number of points sent per request when delineating many outlets
+batch_chunk_size = 1000
+
+# Maximum number of upstream results cached (memory, disk)
+upstream_cache_size = (128, 5000)
+
+# Simplification tolerances (meters) of the upstream catchments geometries, 0
+# stands for the full resolution ones
+simplify_tolerances = [2000, 500, 120, 30, 0]
+
+# Size (meters) of a map pixel at the equator for the zoom 0
+equator_pixel_size = 156543.03
+
+# Simplification tolerance (degrees) of the dissolved upstream area used to
+# clip the forest change map
+outline_tolerance = 0.001
+
+# Approximative size (meters) of a degree
+degree_size = 111320
+
+# Upstream catchments with more features are served as vector tiles
+vector_tile_threshold = 500
+
+# Vector tiles served by the local tile server, reached by the browser through
+# jupyter-server-proxy under the Jupyter base url (i.e. "/user/<name>/"). Use
+# "http://127.0.0.1:{port}" when the browser runs on the kernel machine
+tile_server_url = "{base_url}proxy/{port}"
+tile_layer_name = "catchments"
+tile_extent = 4096
+tile_buffer = 8
+tile_cache_size = 1024
+
+# Zonal statistics batches: maximum number of basins and area (km²) per
+# batch, concurrent batches, retries of a failing batch before splitting it
+# and delay (seconds) between retries
+stats_chunk_size = 50
+stats_chunk_area = 100000
+stats_max_workers = 4
+stats_retries = 2
+stats_retry_delay = 2
+
+# Earth Engine errors (lower case message parts) worth a retry or a split of
+# the batch, any other error is raised right away
+stats_retry_errors = ["timed out", "memory limit exceeded"]
+
+# Maximum number of basin statistics cached (memory, disk), 0 disables the disk
+stats_cache_size = (5000, 50000)
+
+# Selections with more basins or a larger area (km²) are reduced by an
+# export task, polled every export_poll_interval seconds. The temporary
+# table is written in export_asset_folder (the user asset root if None)
+export_feature_threshold = 2000
+export_area_threshold = 2000000
+export_poll_interval = 10
+export_asset_folder = None
+
+# Number of features read per request from the exported table, Earth Engine
+# doesn't return collections of more than 5000 elements
+export_page_size = 5000
+
+# Time (seconds) a dashboard figure waits for other trait changes before
+# being rendered, a burst of changes triggers a single render
+render_delay = 0.05
+
+# Maximum number of derived statistics views (pie, bars, trend...) memoized
+derived_cache_size = 256
+
+# Reduction scale (meters) of the coarse statistics displayed while the native
+# ones are computed in the background
+preview_scale = 300
+
+# Zonal statistics backends: "ee" reduces in Earth Engine, "local" reads the
+# GFC tiles of gfc_tiles_dir by windows of local_block_size pixels, with
+# local_max_workers processes
+stats_backends = ["ee", "local"]
+local_block_size = 2048
+local_max_workers = 4
+
+# Statistics modes: "direct" reduces the classes of the current years and
+# threshold, "histogram" reduces them once for any years and threshold
+stats_modes = ["direct", "histogram"]
+
 # Create a visualization parameters to the selected element
 selected_style = {"fillOpacity": 0.1, "weight": 2, "color": "black"}
 hover_style = {"color": "white", "dashArray": "0", "fillOpacity": 0, "weight": 3}
+tile_style = {"fill": True, "fillOpacity": 0.1, "weight": 2}
 
 # Create a name to the marker point in the map
 marker_name = "Marker"
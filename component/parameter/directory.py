@@ -2,3 +2,13 @@ from pathlib import Path
 
 module_dir = Path.home() / "module_results/basin_rivers"
 module_dir.mkdir(exist_ok=True, parents=True)
+
+hybas_dir = module_dir / "hybas"
+hybas_dir.mkdir(exist_ok=True, parents=True)
+
+cache_dir = module_dir / "cache"
+cache_dir.mkdir(exist_ok=True, parents=True)
+
+# Local GFC tiles (Hansen GeoTIFF) of the "local" statistics backend
+gfc_tiles_dir = module_dir / "gfc"
+gfc_tiles_dir.mkdir(exist_ok=True, parents=True)
@@ -1 +1,14 @@
 from .utils import *
+from .hybas import *
+from .batch import *
+from .cache import *
+from .geometry import *
+from .tiles import *
+from .zonal import *
+from .export import *
+from .gfc import *
+from .raster import *
+from .reduction import *
+from .stats import *
+from .traces import *
+from .render import *
@@ -0,0 +1,99 @@
+import numpy as np
+import ee
+
+import component.parameter as param
+from .utils import get_hydroshed
+from .hybas import BasinTopology, get_topology, get_upstream_levels
+
+__all__ = ["get_outlet_basins", "delineate_outlets"]
+
+
+def get_outlet_basins(collection, outlets, chunk_size=None):
+    """Return the HYBAS_ID of the basin containing every outlet
+
+    Points are sent by chunks and matched with the basins through a single
+    spatial join per chunk instead of one request per point.
+
+    Args:
+        collection (ee.FeatureCollection): HydroBASINS collection of one level
+        outlets (list): (lat, lon) coordinates of the outlets
+        chunk_size (int): number of points per request
+
+    Returns:
+        list: HYBAS_ID of every outlet, None if it doesn't fall in any basin
+    """
+
+    chunk_size = chunk_size or param.batch_chunk_size
+
+    hybas_ids = [None] * len(outlets)
+
+    for start in range(0, len(outlets), chunk_size):
+
+        points = ee.FeatureCollection(
+            [
+                ee.Feature(ee.Geometry.Point([lon, lat]), {"idx": start + i})
+                for i, (lat, lon) in enumerate(outlets[start : start + chunk_size])
+            ]
+        )
+
+        joined = ee.Join.saveFirst("basin").apply(
+            points,
+            collection,
+            ee.Filter.intersects(leftField=".geo", rightField=".geo"),
+        )
+
+        pairs = (
+            joined.map(
+                lambda f: f.set("HYBAS_ID", ee.Feature(f.get("basin")).get("HYBAS_ID"))
+            )
+            .reduceColumns(ee.Reducer.toList(2), ["idx", "HYBAS_ID"])
+            .get("list")
+            .getInfo()
+        )
+
+        for idx, hybas_id in pairs:
+            hybas_ids[idx] = hybas_id
+
+    return hybas_ids
+
+
+def delineate_outlets(outlets, level, engine="rounds"):
+    """Return the upstream catchments of many outlets at once
+
+    The outlet basins are resolved with one spatial join, then the traversal
+    is shared by all the outlets: the "local" engine reads every closure from
+    the cached topology of the level, the server engines fetch the union of
+    all the closures in rounds and split it locally per outlet.
+
+    Args:
+        outlets (list): (lat, lon) coordinates of the outlets
+        level (int): HydroBASINS level
+        engine (str): "local" or a server engine (see BasinModel.engine)
+
+    Returns:
+        list: HYBAS_ID list of the upstream catchments of every outlet in
+            breadth first order, empty for the outlets out of any basin.
+    """
+
+    collection = get_hydroshed(level)
+    outlet_ids = get_outlet_basins(collection, outlets)
+    unique_ids = sorted({i for i in outlet_ids if i is not None})
+
+    if engine == "local":
+        topology = get_topology(level)
+
+    else:
+        levels = get_upstream_levels(
+            collection, collection.filter(ee.Filter.inList("HYBAS_ID", unique_ids))
+        )
+
+        # every basin is fetched once, outlets upstream of other outlets
+        # included (see get_upstream_levels)
+        rows = np.array([row for level in levels for row in level], dtype=np.int64)
+        rows = rows.reshape(-1, 2)
+
+        topology = BasinTopology(rows[:, 0], rows[:, 1])
+
+    closures = {hybas_id: topology.upstream([hybas_id]) for hybas_id in unique_ids}
+
+    return [closures[i] if i is not None else [] for i in outlet_ids]
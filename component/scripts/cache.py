@@ -0,0 +1,191 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import component.parameter as param
+
+__all__ = ["LRUCache"]
+
+# maximum number of keys bound in a single sqlite query
+SQL_VARIABLES = 900
+
+
+class LRUCache:
+    """Two tier least recently used cache of JSON serializable values
+
+    Entries are kept in memory in an ordered dict and, optionally, in a
+    sqlite file under the module results folder so they survive the session.
+    Both tiers are size bounded and evict the least recently used entries.
+
+    Args:
+        name (str): name of the cache, used as the sqlite file name
+        max_memory (int): maximum number of entries kept in memory
+        max_disk (int): maximum number of entries kept on disk, 0 to disable
+        directory (Path, optional): folder of the sqlite file
+    """
+
+    def __init__(self, name, max_memory=256, max_disk=10000, directory=None):
+
+        self.name = name
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if max_disk:
+            directory = directory or param.cache_dir
+            self._db = sqlite3.connect(
+                str(directory / f"{name}.sqlite"), check_same_thread=False
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT, atime REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_atime ON cache (atime)")
+            self._db.commit()
+
+    @staticmethod
+    def _key(key):
+        """Return the string form of a key (any JSON serializable object)"""
+
+        return json.dumps(key, default=str)
+
+    def _remember(self, key, value):
+        """Set a key in the memory tier and evict the oldest entries"""
+
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def get(self, key, default=None):
+        """Return the cached value of the key, default if it's missing"""
+
+        return self.get_many([key], default)[0]
+
+    def get_many(self, keys, default=None):
+        """Return the cached values of the keys, default for the missing ones
+
+        The disk tier is read and the access times of its hits are updated in
+        a single transaction.
+        """
+
+        keys = [self._key(key) for key in keys]
+        values = [default] * len(keys)
+
+        with self._lock:
+
+            missing = []
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    values[i] = self._memory[key]
+                else:
+                    missing.append(i)
+
+            found = {}
+            if missing and self._db:
+
+                unique = list(dict.fromkeys(keys[i] for i in missing))
+                for start in range(0, len(unique), SQL_VARIABLES):
+                    chunk = unique[start : start + SQL_VARIABLES]
+                    found.update(
+                        self._db.execute(
+                            "SELECT key, value FROM cache WHERE key IN "
+                            f"({', '.join('?' * len(chunk))})",
+                            chunk,
+                        ).fetchall()
+                    )
+
+                if found:
+                    now = time.time()
+                    self._db.executemany(
+                        "UPDATE cache SET atime = ? WHERE key = ?",
+                        [(now, key) for key in found],
+                    )
+                    self._db.commit()
+
+            for key in found:
+                found[key] = json.loads(found[key])
+                self._remember(key, found[key])
+
+            misses = 0
+            for i in missing:
+                if keys[i] in found:
+                    values[i] = found[keys[i]]
+                else:
+                    misses += 1
+
+            self.hits += len(keys) - misses
+            self.misses += misses
+
+        return values
+
+    def set(self, key, value):
+        """Store the value of the key in both tiers"""
+
+        self.set_many([(key, value)])
+
+    def set_many(self, items):
+        """Store the (key, value) pairs in both tiers
+
+        The disk tier is written in a single transaction, the least recently
+        used entries are only evicted when it holds more than max_disk.
+        """
+
+        items = [(self._key(key), value) for key, value in items]
+
+        with self._lock:
+
+            for key, value in items:
+                self._remember(key, value)
+
+            if not self._db or not items:
+                return
+
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                [(key, json.dumps(value), now) for key, value in items],
+            )
+
+            excess = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            excess -= self.max_disk
+
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY atime LIMIT ?)",
+                    (excess,),
+                )
+
+            self._db.commit()
+
+    def __contains__(self, key):
+
+        key = self._key(key)
+
+        if key in self._memory:
+            return True
+
+        return bool(
+            self._db
+            and self._db.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone()
+        )
+
+    def clear(self):
+        """Remove all the entries of both tiers"""
+
+        with self._lock:
+            self._memory.clear()
+            if self._db:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
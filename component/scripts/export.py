@@ -0,0 +1,185 @@
+import time
+
+import ee
+
+import component.parameter as param
+from .utils import get_running_loop
+
+__all__ = ["EETaskRunner", "FakeTaskRunner", "ExportPoller"]
+
+
+def flatten_groups(feature):
+    """Return a geometry-less feature with one "class_<code>" property per group
+
+    Table exports don't keep list of dictionaries properties, the grouped
+    sums are then stored as flat numeric properties.
+    """
+
+    groups = ee.List(feature.get("groups"))
+    keys = groups.map(
+        lambda g: ee.String("class_").cat(
+            ee.Number(ee.Dictionary(g).get("group")).int().format()
+        )
+    )
+    values = groups.map(lambda g: ee.Dictionary(g).get("sum"))
+
+    return ee.Feature(None, ee.Dictionary.fromLists(keys, values)).set(
+        "HYBAS_ID", feature.get("HYBAS_ID")
+    )
+
+
+def unflatten_groups(result):
+    """Rebuild the reduceRegions "groups" property from the flat class properties"""
+
+    for feature in result["features"]:
+
+        properties = feature["properties"]
+        groups = [
+            {"group": int(key.split("_")[1]), "sum": properties.pop(key)}
+            for key in [k for k in properties if k.startswith("class_")]
+        ]
+        properties["groups"] = sorted(groups, key=lambda g: g["group"])
+
+    return result
+
+
+class EETaskRunner:
+    """Run reductions as Earth Engine table exports to a temporary asset"""
+
+    def submit(self, collection, description):
+        """Start the export of the reduced collection and return its handle"""
+
+        folder = param.export_asset_folder or ee.data.getAssetRoots()[0]["id"]
+        asset_id = f"{folder}/{description}"
+
+        task = ee.batch.Export.table.toAsset(
+            collection=collection.map(flatten_groups),
+            description=description,
+            assetId=asset_id,
+        )
+        task.start()
+
+        return {"task": task, "asset_id": asset_id}
+
+    def status(self, handle):
+        """Return the state of the task (READY, RUNNING, COMPLETED, FAILED...)"""
+
+        return handle["task"].status()["state"]
+
+    def fetch(self, handle):
+        """Return the exported reduction as a feature collection dict and
+        remove the temporary asset
+
+        The table is read by pages of param.export_page_size features, Earth
+        Engine doesn't return larger collections in a single request.
+        """
+
+        collection = ee.FeatureCollection(handle["asset_id"])
+        size, page = collection.size().getInfo(), param.export_page_size
+
+        features = []
+        for offset in range(0, size, page):
+            features += collection.toList(page, offset).getInfo()
+
+        ee.data.deleteAsset(handle["asset_id"])
+
+        return unflatten_groups({"type": "FeatureCollection", "features": features})
+
+
+class FakeTaskRunner:
+    """Offline task runner with the EETaskRunner interface
+
+    The task completes after a given number of status polls with the result
+    of a local function, so the polling and ingestion flow can run without
+    Earth Engine.
+
+    Args:
+        compute (callable): function returning the result from the collection
+        polls (int): number of status polls before the task completes
+        fail (bool): whether the task fails instead of completing
+    """
+
+    def __init__(self, compute, polls=2, fail=False):
+
+        self.compute = compute
+        self.polls = polls
+        self.fail = fail
+
+    def submit(self, collection, description):
+
+        return {"collection": collection, "description": description, "polls": 0}
+
+    def status(self, handle):
+
+        handle["polls"] += 1
+
+        if handle["polls"] < self.polls:
+            return "RUNNING"
+
+        return "FAILED" if self.fail else "COMPLETED"
+
+    def fetch(self, handle):
+
+        return self.compute(handle["collection"])
+
+
+class ExportPoller:
+    """Poll an export task on the kernel event loop and ingest its result
+
+    Polls are scheduled with call_later, so the kernel keeps running other
+    cells and widget events between them. Without a running event loop (i.e.
+    in a script), start polls until the task is done.
+
+    Args:
+        runner (EETaskRunner|FakeTaskRunner): runner of the task
+        handle (dict): handle returned by runner.submit
+        on_done (callable): function called with the fetched result
+        on_error (callable): function called with the error of a failed task
+        interval (float): delay between two polls (seconds)
+    """
+
+    def __init__(self, runner, handle, on_done, on_error, interval=None):
+
+        self.runner = runner
+        self.handle = handle
+        self.on_done = on_done
+        self.on_error = on_error
+        self.interval = param.export_poll_interval if interval is None else interval
+
+        self.state = "SUBMITTED"
+        self.loop = None
+
+    def start(self):
+        """Schedule the first poll, or poll until the task is done"""
+
+        self.loop = get_running_loop()
+
+        if self.loop is not None:
+            self.loop.call_later(self.interval, self.poll)
+            return self
+
+        while True:
+            time.sleep(self.interval)
+            if self.poll() in ["COMPLETED", "FAILED", "CANCELLED"]:
+                return self
+
+    def poll(self):
+        """Check the task state once and reschedule, ingest or fail accordingly"""
+
+        try:
+            self.state = self.runner.status(self.handle)
+
+            if self.state == "COMPLETED":
+                self.on_done(self.runner.fetch(self.handle))
+
+            elif self.state in ["FAILED", "CANCELLED"]:
+                self.on_error(Exception(f"The statistics export task {self.state}"))
+
+            elif self.loop is not None:
+                self.loop.call_later(self.interval, self.poll)
+
+        except Exception as e:
+            self.state = "FAILED"
+            self.on_error(e)
+
+        return self.state
@@ -0,0 +1,117 @@
+import json
+
+import numpy as np
+import shapely
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+
+import component.parameter as param
+
+__all__ = ["get_tolerance", "CatchmentStore"]
+
+
+def get_tolerance(zoom):
+    """Return the simplification tolerance (in meters) fitting a map zoom
+
+    The tolerance is the largest value of the simplification ladder that is
+    smaller than the size of a screen pixel at the equator for that zoom, so
+    the simplification is never visible on the map.
+
+    Args:
+        zoom (int): leaflet zoom level
+    """
+
+    pixel_size = param.equator_pixel_size / 2**zoom
+
+    return max(t for t in param.simplify_tolerances if t <= pixel_size)
+
+
+class CatchmentStore:
+    """Indexed in memory store of the loaded upstream catchments
+
+    The geojson features are parsed once in a GeoDataFrame indexed by
+    HYBAS_ID, with the bounds of every feature and an STRtree so selections,
+    bounds and point lookups are index operations.
+
+    Args:
+        data (dict): upstream catchments in a geojson format
+    """
+
+    def __init__(self, data):
+
+        self.gdf = GeoDataFrame.from_features(data["features"], crs="EPSG:4326")
+        self.gdf.index = self.gdf["HYBAS_ID"].to_numpy()
+
+        self.bounds = self.gdf.bounds
+        self.tree = self.gdf.sindex
+
+        self._outlines = {}
+
+    def has(self, hybas_ids):
+        """Return whether all the given HYBAS_ID(s) are in the store"""
+
+        return bool(np.isin(hybas_ids, self.gdf.index).all())
+
+    def select(self, hybas_ids):
+        """Return the GeoDataFrame of the given HYBAS_ID(s)"""
+
+        return self.gdf.loc[self.gdf.index.intersection(hybas_ids, sort=False)]
+
+    def to_geojson(self, hybas_ids):
+        """Return the geojson dict of the given HYBAS_ID(s)"""
+
+        return json.loads(self.select(hybas_ids).to_json())
+
+    def total_bounds(self, hybas_ids=None):
+        """Return the (minx, miny, maxx, maxy) bounds of the given HYBAS_ID(s)
+
+        Args:
+            hybas_ids (list, optional): HYBAS_ID(s), all the features if None
+        """
+
+        bounds = self.bounds if hybas_ids is None else self.bounds.loc[hybas_ids]
+        bounds = bounds.to_numpy()
+
+        return [
+            *np.min(bounds[:, :2], axis=0).tolist(),
+            *np.max(bounds[:, 2:], axis=0).tolist(),
+        ]
+
+    def outline(self, buffer=0):
+        """Return the dissolved and lightly simplified outline of all the catchments
+
+        The union is computed with shapely's cascaded union (STRtree based)
+        and cached by buffer.
+
+        Args:
+            buffer (float): distance (degrees) added around the outline, to
+                cover the catchments when their geometries are simplified
+        """
+
+        if buffer not in self._outlines:
+
+            tolerance = param.outline_tolerance
+            outline = shapely.union_all(self.gdf.geometry.to_numpy())
+            outline = outline.buffer(buffer + tolerance).simplify(tolerance)
+
+            self._outlines[buffer] = outline
+
+        return self._outlines[buffer]
+
+    def at(self, lon, lat, buffer=0):
+        """Return the HYBAS_ID of the catchment containing the point, None if any
+
+        Args:
+            buffer (float): distance (degrees) around the point, the HYBAS_ID
+                is only returned when a single catchment intersects it, i.e.
+                when the point is not close to the (simplified) borders
+        """
+
+        point = Point(lon, lat)
+        point = point.buffer(buffer) if buffer else point
+        rows = self.tree.query(point, predicate="intersects")
+
+        if not len(rows) or (buffer and len(rows) > 1):
+            return None
+
+        return int(self.gdf.index[rows[0]])
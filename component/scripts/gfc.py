@@ -0,0 +1,226 @@
+import numpy as np
+import ee
+
+import component.parameter as param
+
+__all__ = [
+    "classify",
+    "get_class_lut",
+    "encode_classes",
+    "classify_lut",
+    "get_gfc_image",
+    "encode_histogram",
+    "decode_histogram",
+    "get_histogram_image",
+    "classify_histograms",
+]
+
+
+def classify(treecov, lossy, gain, thres, iniy, stopy):
+    """Return the forest change class of every pixel, vectorized with numpy
+
+    Reference implementation: same rules and precedence as the chained
+    where of the original forest change image, 30 non forest, 40 stable
+    forest, 50 gain, 51 gain and loss, the loss year (iniy to stopy) for the
+    forest loss, 0 for the masked pixels. See classify_lut for the fast kernel.
+
+    Args:
+        treecov (array): tree cover in 2000 (%)
+        lossy (array): loss year since 2000, 0 for no loss
+        gain (array): 1 for the gain pixels
+        thres (int): minimum tree cover of a forest pixel
+        iniy, stopy (int): first and last loss years since 2000
+    """
+
+    treecov, lossy, gain = np.broadcast_arrays(treecov, lossy, gain)
+
+    forest = treecov > thres
+    no_forest = ~forest
+    span = (lossy >= iniy) & (lossy <= stopy)
+
+    out = np.zeros(treecov.shape, dtype=np.uint8)
+    out[no_forest & (gain == 1)] = 50
+    out[no_forest & (gain == 0)] = 30
+    out[forest & (lossy < iniy)] = 30
+    out[forest & (lossy > stopy)] = 40
+    out[forest & (gain == 1) & span] = 51
+    out[forest & (gain == 1) & (lossy == 0)] = 50
+
+    loss = forest & (gain == 0) & span
+    out[loss] = lossy[loss]
+
+    out[forest & (gain == 0) & (lossy == 0)] = 40
+
+    return out
+
+
+def get_class_lut(iniy, stopy):
+    """Return the forest change class of every code of encode_classes
+
+    The class only depends on whether the pixel is a forest, on the gain and
+    on the loss year, the table is then built once per years span with the
+    reference rules of classify.
+
+    Args:
+        iniy, stopy (int): first and last loss years since 2000
+
+    Returns:
+        array: (4 * param.hist_lossy_size) classes, indexed by code
+    """
+
+    forest, gain, lossy = np.unravel_index(
+        np.arange(4 * param.hist_lossy_size), (2, 2, param.hist_lossy_size)
+    )
+
+    # a tree cover of 1 is a forest for a null threshold
+    return classify(forest, lossy, gain, 0, iniy, stopy)
+
+
+def encode_classes(forest, lossy, gain):
+    """Return the packed class code of (forest, loss year, gain) pixels
+
+    Args:
+        forest (array): 1 for the pixels having more tree cover than the threshold
+        lossy (array): loss year since 2000, 0 for no loss
+        gain (array): 1 for the gain pixels
+    """
+
+    return (forest * 2 + gain) * param.hist_lossy_size + lossy
+
+
+def classify_lut(treecov, lossy, gain, thres, iniy, stopy):
+    """Return the forest change class of every pixel with a lookup table
+
+    One comparison, one packed code and one table lookup per pixel, same
+    arguments and result as classify.
+    """
+
+    forest = np.asarray(treecov) > thres
+    codes = encode_classes(forest.astype(np.int64), np.asarray(lossy), gain)
+
+    return get_class_lut(iniy, stopy)[codes]
+
+
+def get_gfc_image(aoi, thres, years):
+    """Return the forest change class image of the GFC dataset
+
+    The image is the remap of the packed (forest, loss year, gain) code by the
+    lookup table of get_class_lut, the masked pixels are the class 0 ones. Its
+    band is named "constant" as the chained where one (see param.gfc_vis).
+
+    Params:
+        aoi (ee.Geometry): area of interest to clip the image
+        thres (int): minimum tree cover of a forest pixel
+        years (list): first and last years of the analysis
+    """
+
+    gfc = ee.Image(param.gfc_dataset).clip(aoi)
+
+    forest = gfc.select(["treecover2000"]).gt(thres)
+    lossy = gfc.select(["lossyear"]).unmask(0)
+    gain = gfc.select(["gain"])
+
+    lut = get_class_lut(years[0] - 2000, years[1] - 2000)
+
+    return (
+        forest.multiply(2)
+        .add(gain)
+        .multiply(param.hist_lossy_size)
+        .add(lossy)
+        .remap(list(range(len(lut))), lut.tolist())
+        .selfMask()
+        .rename("constant")
+    )
+
+
+def encode_histogram(treecov, lossy, gain):
+    """Return the packed histogram code of (tree cover, loss year, gain)"""
+
+    return (treecov * param.hist_lossy_size + lossy) * 2 + gain
+
+
+def decode_histogram(code):
+    """Return the (tree cover, loss year, gain) arrays of packed histogram codes"""
+
+    code = np.asarray(code, dtype=np.int64)
+
+    return (
+        code // 2 // param.hist_lossy_size,
+        code // 2 % param.hist_lossy_size,
+        code % 2,
+    )
+
+
+def get_histogram_image(aoi):
+    """Return the packed (tree cover, loss year, gain) code image of the GFC
+
+    The image doesn't depend on the threshold or the years, so its per basin
+    area histograms can be classified afterwards for any of them.
+
+    Params:
+        aoi (ee.Geometry): area of interest to clip the image
+    """
+
+    gfc = ee.Image(param.gfc_dataset).clip(aoi)
+
+    treecov = gfc.select(["treecover2000"])
+    lossy = gfc.select(["lossyear"]).unmask(0)
+    gain = gfc.select(["gain"])
+
+    return (
+        treecov.multiply(param.hist_lossy_size)
+        .add(lossy)
+        .multiply(2)
+        .add(gain)
+        .int()
+        .rename("code")
+    )
+
+
+def classify_histograms(result, thres, years):
+    """Classify per basin area histograms as the forest change reduction
+
+    Args:
+        result (dict): reduceRegions result grouped by histogram code
+        thres (int): minimum tree cover of a forest pixel
+        years (list): first and last years of the analysis
+
+    Returns:
+        dict: reduceRegions result grouped by forest change class, the same
+            structure as the direct reduction
+    """
+
+    features = result["features"]
+
+    basin, codes, areas = [], [], []
+    for i, feature in enumerate(features):
+        for group in feature["properties"]["groups"]:
+            basin.append(i)
+            codes.append(group["group"])
+            areas.append(group["sum"])
+
+    classes = classify_lut(
+        *decode_histogram(codes), thres, years[0] - 2000, years[1] - 2000
+    )
+
+    # sum the areas by (basin, class) in one pass
+    class_areas = np.zeros((len(features), 256))
+    np.add.at(class_areas, (np.asarray(basin, dtype=int), classes), areas)
+    class_areas[:, 0] = 0
+
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {
+                    "HYBAS_ID": feature["properties"]["HYBAS_ID"],
+                    "groups": [
+                        {"group": int(c), "sum": float(class_areas[i, c])}
+                        for c in np.flatnonzero(class_areas[i])
+                    ],
+                },
+            }
+            for i, feature in enumerate(features)
+        ],
+    }
@@ -0,0 +1,546 @@
+import numpy as np
+import ee
+
+import component.parameter as param
+
+__all__ = [
+    "BasinTopology",
+    "BasinHierarchy",
+    "get_hybas_table",
+    "get_hybas_bounds",
+    "get_basin_bounds",
+    "get_topology",
+    "get_hierarchy",
+    "get_upstream_levels",
+    "accumulate_upstream",
+]
+
+
+def get_hybas_table(level, columns=("HYBAS_ID", "NEXT_DOWN", "PFAF_ID")):
+    """Return the HydroBASINS attribute table of the given level as numpy arrays
+
+    The table is read from the local cache folder when it exists, otherwise it
+    is requested to Earth Engine one HydroBASINS region at a time (first digit
+    of the HYBAS_ID) and saved as a compressed npz file. A drainage tree never
+    crosses a region so the collection order is preserved inside every tree.
+
+    Args:
+        level (int): HydroBASINS level
+        columns (tuple): attribute names to load
+
+    Returns:
+        dict: column name as key and numpy array as value
+    """
+
+    table_file = param.hybas_dir / f"hybas_{level}_{'_'.join(columns).lower()}.npz"
+
+    if table_file.exists():
+        with np.load(table_file) as npz:
+            return {column: npz[column] for column in columns}
+
+    collection = ee.FeatureCollection(param.hybas_dataset.format(level))
+
+    rows = np.array(_get_region_rows(collection, columns), dtype=np.int64)
+    rows = rows.reshape(-1, len(columns))
+    table = {column: rows[:, i] for i, column in enumerate(columns)}
+
+    np.savez_compressed(table_file, **table)
+
+    return table
+
+
+def get_hybas_bounds(level):
+    """Return the bounding box of every basin of the given level
+
+    The boxes are computed once in Earth Engine, one region at a time, and
+    saved as a compressed npz file in the local cache folder.
+
+    Args:
+        level (int): HydroBASINS level
+
+    Returns:
+        dict: HYBAS_ID array and (n, 4) array of (minx, miny, maxx, maxy) bounds
+    """
+
+    bounds_file = param.hybas_dir / f"hybas_{level}_bounds.npz"
+
+    if bounds_file.exists():
+        with np.load(bounds_file) as npz:
+            return {"HYBAS_ID": npz["HYBAS_ID"], "bounds": npz["bounds"]}
+
+    def set_bounds(feature):
+        coords = ee.List(feature.geometry().bounds().coordinates().get(0))
+        ll, ur = ee.List(coords.get(0)), ee.List(coords.get(2))
+        return feature.set(
+            {"minx": ll.get(0), "miny": ll.get(1), "maxx": ur.get(0), "maxy": ur.get(1)}
+        )
+
+    collection = ee.FeatureCollection(param.hybas_dataset.format(level))
+    columns = ["HYBAS_ID", "minx", "miny", "maxx", "maxy"]
+
+    rows = np.array(_get_region_rows(collection, columns, set_bounds), dtype=float)
+    rows = rows.reshape(-1, len(columns))
+    table = {"HYBAS_ID": rows[:, 0].astype(np.int64), "bounds": rows[:, 1:]}
+
+    np.savez_compressed(bounds_file, **table)
+
+    return table
+
+
+def get_basin_bounds(level, hybas_ids):
+    """Return the (minx, miny, maxx, maxy) union of the bounds of the basins
+
+    Args:
+        level (int): HydroBASINS level
+        hybas_ids (list): HYBAS_ID(s) of the basins
+    """
+
+    table = get_hybas_bounds(level)
+    bounds = table["bounds"][_lookup(table["HYBAS_ID"], hybas_ids)]
+
+    return [*bounds[:, :2].min(axis=0).tolist(), *bounds[:, 2:].max(axis=0).tolist()]
+
+
+def _get_region_rows(collection, columns, prepare=None):
+    """Return the rows of the given columns, requested one region at a time
+
+    Args:
+        collection (ee.FeatureCollection): HydroBASINS collection of one level
+        columns (list): property names to read
+        prepare (callable, optional): function mapped over the features first
+    """
+
+    rows = []
+    for region in param.hybas_regions:
+
+        region_basins = collection.filter(
+            ee.Filter.And(
+                ee.Filter.gte("HYBAS_ID", region * 10**9),
+                ee.Filter.lt("HYBAS_ID", (region + 1) * 10**9),
+            )
+        )
+
+        if prepare:
+            region_basins = region_basins.map(prepare)
+
+        rows += (
+            region_basins.reduceColumns(ee.Reducer.toList(len(columns)), list(columns))
+            .get("list")
+            .getInfo()
+        )
+
+    return rows
+
+
+def _lookup(keys, values, strict=True, sorter=None):
+    """Return the position of the values in the keys array, -1 if missing
+
+    Args:
+        keys (array): unique keys
+        values (array): values to look for
+        strict (bool): raise if a value is not in the keys
+        sorter (array, optional): argsort of the keys, computed if not given
+    """
+
+    values = np.asarray(values, dtype=np.int64)
+
+    if len(keys):
+        sorter = np.argsort(keys, kind="stable") if sorter is None else sorter
+        pos = np.clip(np.searchsorted(keys, values, sorter=sorter), 0, len(keys) - 1)
+        pos = sorter[pos]
+        found = keys[pos] == values
+    else:
+        pos = found = np.zeros(values.shape, dtype=bool)
+
+    if strict and not found.all():
+        raise Exception(f"Unknown id(s): {values[~found].tolist()}")
+
+    return np.where(found, pos, -1)
+
+
+def _csr(parent, size):
+    """Return the (indptr, indices) arrays of the children of every parent row
+
+    Children are ordered by (parent, row) so every slice keeps collection order.
+
+    Args:
+        parent (array): parent row of every row, -1 for the ones without parent
+        size (int): number of parent rows
+    """
+
+    has_parent = np.flatnonzero(parent >= 0)
+    indices = has_parent[np.argsort(parent[has_parent], kind="stable")]
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(parent[has_parent], minlength=size), out=indptr[1:])
+
+    return indptr, indices
+
+
+def _gather(indptr, indices, rows):
+    """Return the sorted concatenation of the CSR slices of the given rows"""
+
+    rows = np.asarray(rows, dtype=np.int64)
+
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+
+    # vectorized concatenation of the CSR slices
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+
+    return np.sort(indices[offsets + np.arange(counts.sum())])
+
+
+def get_upstream_levels(collection, outlets, depth=None):
+    """Return the upstream catchments of the outlets level by level
+
+    The traversal is driven from the client: every request expands ``depth``
+    levels of the frontier in Earth Engine and returns the (HYBAS_ID,
+    NEXT_DOWN) rows of each of them. It stops as soon as a level is empty, so
+    there is no maximum number of levels. Every basin is returned once, in
+    the level of its closest outlet, even when outlets are nested.
+
+    Args:
+        collection (ee.FeatureCollection): HydroBASINS collection of one level
+        outlets (ee.FeatureCollection): outlet basin(s) from the collection
+        depth (int): number of levels expanded per request
+
+    Returns:
+        list: one list of [HYBAS_ID, NEXT_DOWN] rows per level, starting with
+            the outlets, each of them in collection order
+    """
+
+    depth = depth or param.upstream_round_depth
+
+    def get_rows(fc):
+        return fc.reduceColumns(ee.Reducer.toList(2), ["HYBAS_ID", "NEXT_DOWN"]).get(
+            "list"
+        )
+
+    levels, seen = [], set()
+    outlet_ids = outlets.aggregate_array("HYBAS_ID")
+    frontier = outlet_ids
+
+    # nested outlets (i.e. gauging stations) are upstream of other outlets,
+    # they are only expanded as outlets so their subtree is fetched once
+    not_outlet = ee.Filter.inList("HYBAS_ID", outlet_ids).Not()
+
+    while True:
+
+        # the first request also returns the outlets rows
+        rounds = [] if levels else [get_rows(outlets)]
+
+        ids = frontier
+        for _ in range(depth):
+            upper_catchments = collection.filter(
+                ee.Filter.And(ee.Filter.inList("NEXT_DOWN", ids), not_outlet)
+            )
+            ids = upper_catchments.aggregate_array("HYBAS_ID")
+            rounds.append(get_rows(upper_catchments))
+
+        for level in ee.List(rounds).getInfo():
+
+            level = [row for row in level if row[0] not in seen]
+            seen.update(row[0] for row in level)
+
+            if not level:
+                return levels
+
+            levels.append(level)
+
+        frontier = ee.List([row[0] for row in levels[-1]])
+
+
+class BasinTopology:
+    """Array based adjacency index of a HydroBASINS drainage forest
+
+    The upstream neighbours of every basin are stored as CSR arrays (indptr,
+    indices) over the row position of the basins in the attribute table, so
+    an upstream closure is a breadth first search over integer slices.
+
+    On first use, a nested-set numbering of the forest is also built: every
+    basin gets its pre-order position ``tin`` and the ``size`` of its
+    upstream subtree, so all the upstream basins of a row are the contiguous
+    slice ``order[tin:tin + size]``.
+
+    Args:
+        hybas_id (array): HYBAS_ID of every basin, in collection order
+        next_down (array): NEXT_DOWN of every basin, 0 for the outlets
+        pfaf_id (array, optional): PFAF_ID of every basin
+    """
+
+    def __init__(self, hybas_id, next_down, pfaf_id=None):
+
+        self.hybas_id = np.asarray(hybas_id, dtype=np.int64)
+        self.next_down = np.asarray(next_down, dtype=np.int64)
+        self.pfaf_id = None if pfaf_id is None else np.asarray(pfaf_id, np.int64)
+
+        # sorted view of the ids to translate HYBAS_ID into row positions
+        self._sorter = np.argsort(self.hybas_id, kind="stable")
+
+        # row position of the downstream basin, -1 for the outlets
+        self.parent = self.rows(self.next_down, strict=False)
+        self.indptr, self.indices = _csr(self.parent, len(self))
+
+        self._intervals = None
+
+    def __len__(self):
+        return len(self.hybas_id)
+
+    @classmethod
+    def from_level(cls, level):
+        """Build the topology of a HydroBASINS level"""
+
+        table = get_hybas_table(level)
+
+        return cls(table["HYBAS_ID"], table["NEXT_DOWN"], table["PFAF_ID"])
+
+    def rows(self, hybas_ids, strict=True):
+        """Return the row position of the given HYBAS_ID(s)
+
+        Args:
+            hybas_ids (array): HYBAS_ID to look for
+            strict (bool): raise if an id is unknown, otherwise return -1 for it
+        """
+
+        return _lookup(self.hybas_id, hybas_ids, strict, self._sorter)
+
+    def children(self, rows):
+        """Return the upstream neighbours of the given rows, in collection order"""
+
+        return _gather(self.indptr, self.indices, rows)
+
+    def upstream_rows(self, rows):
+        """Return the rows of the upstream closure of the given rows
+
+        The result follows the order of the server side traversal: first the
+        given rows, then every upstream level in collection order.
+        """
+
+        frontier = np.asarray(rows, dtype=np.int64)
+        levels = [frontier]
+
+        while frontier.size:
+            frontier = self.children(frontier)
+            levels.append(frontier)
+
+        return np.concatenate(levels)
+
+    def _build_intervals(self):
+        """Compute the depth, subtree size and pre-order position of every row
+
+        Every step is vectorized over one level of the forest: sizes are
+        accumulated from the deepest level down to the outlets, positions are
+        propagated from the outlets up using the size of the previous siblings.
+        """
+
+        n = len(self)
+
+        # levels of the forest, starting with the outlets
+        levels = [np.flatnonzero(self.parent < 0)]
+        while levels[-1].size:
+            levels.append(self.children(levels[-1]))
+        levels.pop()
+
+        depth = np.zeros(n, dtype=np.int64)
+        for i, level in enumerate(levels):
+            depth[level] = i
+
+        size = np.ones(n, dtype=np.int64)
+        for level in levels[:0:-1]:
+            np.add.at(size, self.parent[level], size[level])
+
+        # size of the previous siblings, siblings are contiguous in indices
+        before = np.zeros(len(self.indices) + 1, dtype=np.int64)
+        np.cumsum(size[self.indices], out=before[1:])
+        offset = np.zeros(n, dtype=np.int64)
+        offset[self.indices] = before[:-1] - np.repeat(
+            before[self.indptr[:-1]], np.diff(self.indptr)
+        )
+
+        tin = np.zeros(n, dtype=np.int64)
+        roots = levels[0] if levels else np.array([], dtype=np.int64)
+        tin[roots] = np.cumsum(size[roots]) - size[roots]
+        for level in levels[1:]:
+            tin[level] = tin[self.parent[level]] + 1 + offset[level]
+
+        order = np.empty(n, dtype=np.int64)
+        order[tin] = np.arange(n)
+
+        self._intervals = {"depth": depth, "size": size, "tin": tin, "order": order}
+
+        return self._intervals
+
+    @property
+    def intervals(self):
+        """dict: nested-set arrays (depth, size, tin, order) of the forest"""
+
+        return self._intervals or self._build_intervals()
+
+    def subtree_rows(self, row):
+        """Return the rows upstream of the given row (itself included) in pre-order"""
+
+        tin, size = self.intervals["tin"][row], self.intervals["size"][row]
+
+        return self.intervals["order"][tin : tin + size]
+
+    def is_upstream(self, a, b):
+        """Return whether the basin(s) a drain through the basin(s) b
+
+        Args:
+            a, b (int|array): HYBAS_ID(s), a basin is upstream of itself
+        """
+
+        tin, size = self.intervals["tin"], self.intervals["size"]
+        a, b = self.rows(a), self.rows(b)
+
+        return (tin[b] <= tin[a]) & (tin[a] < tin[b] + size[b])
+
+    def subtree_sum(self, values):
+        """Return the sum of the values over the upstream subtree of every row
+
+        Args:
+            values (array): one value (or one row of values) per basin, in
+                collection order
+
+        Returns:
+            array: same shape as values
+        """
+
+        tin, size, order = (self.intervals[k] for k in ["tin", "size", "order"])
+
+        values = np.asarray(values)
+        prefix = np.zeros((len(self) + 1,) + values.shape[1:], dtype=values.dtype)
+        np.cumsum(values[order], axis=0, out=prefix[1:])
+
+        return prefix[tin + size] - prefix[tin]
+
+    def upstream(self, hybas_ids):
+        """Return the HYBAS_ID list of all the upstream catchments
+
+        The closure is read from the nested-set slices and sorted by distance
+        to the outlet, then by collection order, which is the order of the
+        breadth first (and server side) traversal.
+
+        Args:
+            hybas_ids (list): HYBAS_ID(s) of the outlet basin(s)
+        """
+
+        depth = self.intervals["depth"]
+
+        rows, distance = [], []
+        for outlet in self.rows(np.atleast_1d(hybas_ids)):
+            subtree = self.subtree_rows(outlet)
+            rows.append(subtree)
+            distance.append(depth[subtree] - depth[outlet])
+
+        if not rows:
+            return []
+
+        rows, distance = np.concatenate(rows), np.concatenate(distance)
+        rows = rows[np.lexsort((rows, distance))]
+
+        # nested outlets would list the same basins twice
+        _, first = np.unique(rows, return_index=True)
+
+        return self.hybas_id[rows[np.sort(first)]].tolist()
+
+
+class BasinHierarchy:
+    """Parent/child mapping between consecutive HydroBASINS levels
+
+    HydroBASINS are nested Pfafstetter units: the PFAF_ID of a basin has as
+    many digits as its level and starts with the PFAF_ID of the basin that
+    contains it one level above. For every level, the row of the parent basin
+    is stored as one integer array, and the children as CSR arrays.
+
+    Args:
+        get_level (callable): function returning the BasinTopology of a level
+    """
+
+    def __init__(self, get_level=None):
+
+        self.get_level = get_level or get_topology
+        self._parent = {}
+        self._children = {}
+
+    def parent_rows(self, level):
+        """Return the row (in level - 1) of the parent of every basin of level"""
+
+        if level not in self._parent:
+            fine, coarse = self.get_level(level), self.get_level(level - 1)
+            parent = _lookup(coarse.pfaf_id, fine.pfaf_id // 10, strict=False)
+            self._parent[level] = parent.astype(np.int32)
+            self._children[level] = _csr(parent, len(coarse))
+
+        return self._parent[level]
+
+    def child_rows(self, level, rows):
+        """Return the rows (in level + 1) of the children of the given rows"""
+
+        self.parent_rows(level + 1)
+
+        return _gather(*self._children[level + 1], rows)
+
+    def rescale(self, hybas_ids, from_level, to_level):
+        """Return the HYBAS_ID(s) containing (coarser) or contained in (finer)
+        the given basins at another level
+
+        Args:
+            hybas_ids (list): HYBAS_ID(s) at from_level
+            from_level (int): level of the given basins
+            to_level (int): target level
+        """
+
+        rows = self.get_level(from_level).rows(hybas_ids)
+
+        for level in range(from_level, to_level, -1):
+            rows = np.unique(self.parent_rows(level)[rows])
+            rows = rows[rows >= 0]
+
+        for level in range(from_level, to_level):
+            rows = self.child_rows(level, rows)
+
+        return self.get_level(to_level).hybas_id[rows].tolist()
+
+
+_topologies = {}
+_hierarchy = None
+
+
+def get_topology(level):
+    """Return the (memory cached) topology of the given level"""
+
+    if level not in _topologies:
+        _topologies[level] = BasinTopology.from_level(level)
+
+    return _topologies[level]
+
+
+def get_hierarchy():
+    """Return the (memory cached) cross level hierarchy"""
+
+    global _hierarchy
+
+    if _hierarchy is None:
+        _hierarchy = BasinHierarchy()
+
+    return _hierarchy
+
+
+def accumulate_upstream(hybas_ids, next_down, values):
+    """Return the sum of the values of every basin and of all its upstream basins
+
+    The values are accumulated along the NEXT_DOWN tree of the given basins in
+    a single vectorized pass (prefix sums over the nested-set order), basins
+    draining out of the given ones are their outlets.
+
+    Args:
+        hybas_ids (array): HYBAS_ID of the basins
+        next_down (array): NEXT_DOWN of the basins
+        values (array): one value (or one row of values) per basin
+
+    Returns:
+        array: same shape as values
+    """
+
+    return BasinTopology(hybas_ids, next_down).subtree_sum(values)
@@ -0,0 +1,260 @@
+import math
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import rasterio as rio
+import shapely
+from affine import Affine
+from rasterio.enums import Resampling
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
+from shapely.geometry import box
+
+import component.parameter as param
+from .gfc import classify_lut, encode_histogram
+
+__all__ = ["get_gfc_tiles", "get_pixel_areas", "reduce_basin", "reduce_local"]
+
+# GFC layers read by the local statistics, in the classify order
+LAYERS = ["treecover2000", "lossyear", "gain"]
+
+# WGS84 ellipsoid
+SEMI_MAJOR_AXIS = 6378137.0
+ECCENTRICITY = math.sqrt(0.00669437999014)
+
+
+def get_gfc_tiles(directory=None):
+    """Return the local GFC tiles having the three layers
+
+    Tiles are found by their Hansen file names, i.e.
+    "Hansen_GFC-2023-v1.11_lossyear_10N_010E.tif", the layer name being the
+    only difference between the three files of a tile.
+
+    Args:
+        directory (Path, optional): folder of the tiles, param.gfc_tiles_dir
+            if None
+
+    Returns:
+        list: the layer paths and (left, bottom, right, top) bounds of every tile
+    """
+
+    directory = Path(directory or param.gfc_tiles_dir)
+    pattern = re.compile(rf"(.*)_({'|'.join(LAYERS)})_(.*)\.tif$")
+
+    tiles = {}
+    for path in sorted(directory.glob("*.tif")):
+        match = pattern.match(path.name)
+        if match:
+            prefix, layer, name = match.groups()
+            tiles.setdefault((prefix, name), {})[layer] = str(path)
+
+    tiles = [tile for tile in tiles.values() if len(tile) == len(LAYERS)]
+
+    for tile in tiles:
+        with rio.open(tile[LAYERS[0]]) as src:
+            tile["bounds"] = tuple(src.bounds)
+
+    return tiles
+
+
+def get_pixel_areas(transform, rows):
+    """Return the geodesic area (ha) of the pixels of every row of a raster
+
+    The area of a pixel only depends on its latitudes in a geographic grid,
+    it's computed on the WGS84 ellipsoid as the difference of the areas of
+    the latitude bands of its top and bottom edges.
+
+    Args:
+        transform (Affine): geographic transform of the raster (degrees)
+        rows (int): number of rows of the raster
+
+    Returns:
+        array: (rows, 1) areas, broadcastable over the raster columns
+    """
+
+    lat = np.radians(transform.f + transform.e * np.arange(rows + 1))
+
+    sin = np.sin(lat)
+    e_sin = ECCENTRICITY * sin
+    band = sin / (1 - e_sin**2) + np.log((1 + e_sin) / (1 - e_sin)) / (2 * ECCENTRICITY)
+
+    b2 = SEMI_MAJOR_AXIS**2 * (1 - ECCENTRICITY**2)
+    areas = b2 * math.radians(abs(transform.a)) / 2 * np.abs(np.diff(band))
+
+    return (areas / 10000)[:, None]
+
+
+def get_window(src, bounds):
+    """Return the pixel window of the raster covering the bounds, None if empty"""
+
+    minx, miny, maxx, maxy = bounds
+    col_min, row_min = ~src.transform * (minx, maxy)
+    col_max, row_max = ~src.transform * (maxx, miny)
+
+    col_min, row_min = max(math.floor(col_min), 0), max(math.floor(row_min), 0)
+    col_max = min(math.ceil(col_max), src.width)
+    row_max = min(math.ceil(row_max), src.height)
+
+    if col_min >= col_max or row_min >= row_max:
+        return None
+
+    return Window(col_min, row_min, col_max - col_min, row_max - row_min)
+
+
+def get_blocks(window, size):
+    """Yield the sub windows of at most size x size pixels of the window"""
+
+    for row in range(window.row_off, window.row_off + window.height, size):
+        for col in range(window.col_off, window.col_off + window.width, size):
+            yield Window(
+                col,
+                row,
+                min(size, window.col_off + window.width - col),
+                min(size, window.row_off + window.height - row),
+            )
+
+
+def reduce_basin(hybas_id, geometry, tiles, thres=None, years=None, scale=None):
+    """Return the forest change area (ha) by class of a catchment
+
+    The tiles are read by windows of param.local_block_size pixels around the
+    catchment, the polygon is rasterized on every window (pixel centers, as
+    Earth Engine) and the geodesic pixel areas summed by class code. The
+    tiles have to cover the whole catchment, an exception is raised otherwise.
+
+    Args:
+        hybas_id (int): HYBAS_ID of the catchment
+        geometry (shapely.Geometry): geographic geometry of the catchment
+        tiles (list): local GFC tiles, see get_gfc_tiles
+        thres (int): minimum tree cover of a forest pixel, None to sum the
+            areas by histogram code (see cs.encode_histogram)
+        years (list): first and last years of the analysis
+        scale (float, optional): reduction scale (meters), the native pixels
+            are decimated (nearest) to approach it. Native resolution if None.
+
+    Returns:
+        dict: reduceRegions-like feature with the grouped sums
+    """
+
+    # missing tiles would silently drop the area they cover
+    coverage = shapely.union_all([box(*tile["bounds"]) for tile in tiles])
+    if not coverage.covers(geometry):
+        raise Exception(
+            f"The local GFC tiles don't cover the catchment {hybas_id}, "
+            f"download the missing ones in {param.gfc_tiles_dir}."
+        )
+
+    sums = {}
+
+    for tile in tiles:
+
+        left, bottom, right, top = tile["bounds"]
+        minx, miny, maxx, maxy = geometry.bounds
+        if minx > right or maxx < left or miny > top or maxy < bottom:
+            continue
+
+        sources = [rio.open(tile[layer]) for layer in LAYERS]
+
+        try:
+            src = sources[0]
+            window = get_window(src, geometry.bounds)
+            if window is None:
+                continue
+
+            pixel_size = abs(src.transform.a) * param.degree_size
+            factor = max(1, round((scale or pixel_size) / pixel_size))
+
+            for block in get_blocks(window, param.local_block_size):
+
+                shape = (
+                    math.ceil(block.height / factor),
+                    math.ceil(block.width / factor),
+                )
+                transform = src.window_transform(block) * Affine.scale(
+                    block.width / shape[1], block.height / shape[0]
+                )
+
+                mask = geometry_mask(
+                    [geometry], out_shape=shape, transform=transform, invert=True
+                )
+                if not mask.any():
+                    continue
+
+                treecov, lossy, gain = [
+                    source.read(
+                        1, window=block, out_shape=shape, resampling=Resampling.nearest
+                    ).astype(np.int64)
+                    for source in sources
+                ]
+
+                if thres is None:
+                    codes = encode_histogram(treecov, lossy, gain)
+                else:
+                    codes = classify_lut(
+                        treecov, lossy, gain, thres, years[0] - 2000, years[1] - 2000
+                    )
+                    # class 0 is masked in the Earth Engine image
+                    mask &= codes != 0
+
+                areas = np.broadcast_to(get_pixel_areas(transform, shape[0]), shape)
+                block_sums = np.bincount(codes[mask], weights=areas[mask])
+
+                for code in np.flatnonzero(block_sums):
+                    sums[int(code)] = sums.get(int(code), 0) + float(block_sums[code])
+
+        finally:
+            for source in sources:
+                source.close()
+
+    return {
+        "type": "Feature",
+        "geometry": None,
+        "properties": {
+            "HYBAS_ID": hybas_id,
+            "groups": [{"group": code, "sum": sums[code]} for code in sorted(sums)],
+        },
+    }
+
+
+def reduce_local(
+    hybas_ids,
+    geometries,
+    thres=None,
+    years=None,
+    scale=None,
+    tiles=None,
+    max_workers=None,
+):
+    """Reduce the forest change area (ha) by class of catchments from local
+    GFC tiles, without Earth Engine
+
+    Catchments are reduced in parallel by a process pool (see reduce_basin),
+    the result has the reduceRegions structure expected by cs.ZonalStats.
+
+    Args:
+        hybas_ids (list): HYBAS_ID(s) of the catchments
+        geometries (list): geographic shapely geometry of every catchment
+        thres, years, scale: see reduce_basin
+        tiles (list, optional): local GFC tiles, the ones of
+            param.gfc_tiles_dir if None
+        max_workers (int): number of processes, 1 to reduce in this process
+
+    Returns:
+        dict: feature collection of the catchments in the input order
+    """
+
+    tiles = get_gfc_tiles() if tiles is None else tiles
+    max_workers = max_workers or param.local_max_workers
+    args = [hybas_ids, geometries, repeat(tiles), repeat(thres), repeat(years)]
+
+    if max_workers == 1 or len(hybas_ids) < 2:
+        features = list(map(reduce_basin, *args, repeat(scale)))
+
+    else:
+        with ProcessPoolExecutor(min(max_workers, len(hybas_ids))) as executor:
+            features = list(executor.map(reduce_basin, *args, repeat(scale)))
+
+    return {"type": "FeatureCollection", "features": features}
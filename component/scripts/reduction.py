@@ -0,0 +1,91 @@
+import json
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+__all__ = ["read_reduction"]
+
+
+def read_reduction(result):
+    """Return the columnar arrays of a reduceRegions result grouped by class
+
+    A result dict is read in preallocated arrays. A JSON text, file path or
+    file object is decoded with an object hook: every group is appended to
+    typed arrays as soon as it's decoded, so the nested feature dicts are
+    never built. The JSON text itself is read whole in memory.
+
+    Args:
+        result (dict|str|Path|file): reduction result, as a dict or as JSON
+
+    Returns:
+        tuple: HYBAS_ID of every feature, feature index, class code and area
+            of every group
+    """
+
+    if isinstance(result, dict):
+        return _read_dict(result)
+
+    hybas_ids, sizes, codes, areas = [], [], array("q"), array("d")
+    read = [0]
+
+    def hook(obj):
+
+        if "group" in obj and "sum" in obj:
+            codes.append(int(obj["group"]))
+            areas.append(obj["sum"])
+            return None
+
+        # feature properties, decoded right after their groups
+        if "HYBAS_ID" in obj:
+            hybas_ids.append(obj["HYBAS_ID"])
+            sizes.append(len(codes) - read[0])
+            read[0] = len(codes)
+            return None
+
+        return obj
+
+    if hasattr(result, "read"):
+        json.load(result, object_hook=hook)
+
+    elif isinstance(result, str) and result.lstrip().startswith("{"):
+        json.loads(result, object_hook=hook)
+
+    else:
+        with Path(result).open() as f:
+            json.load(f, object_hook=hook)
+
+    return (
+        np.array(hybas_ids, dtype=np.int64),
+        np.repeat(np.arange(len(sizes)), sizes),
+        np.frombuffer(codes, dtype=np.int64),
+        np.frombuffer(areas, dtype=np.float64),
+    )
+
+
+def _read_dict(result):
+    """Return the columnar arrays of a reduction result dict"""
+
+    features = result["features"]
+    groups = [feature["properties"]["groups"] for feature in features]
+
+    sizes = np.fromiter(map(len, groups), dtype=np.int64, count=len(groups))
+    size = int(sizes.sum())
+
+    hybas_ids = np.fromiter(
+        (feature["properties"]["HYBAS_ID"] for feature in features),
+        dtype=np.int64,
+        count=len(features),
+    )
+    codes = np.fromiter(
+        (group["group"] for basin in groups for group in basin),
+        dtype=np.int64,
+        count=size,
+    )
+    areas = np.fromiter(
+        (group["sum"] for basin in groups for group in basin),
+        dtype=np.float64,
+        count=size,
+    )
+
+    return hybas_ids, np.repeat(np.arange(len(groups)), sizes), codes, areas
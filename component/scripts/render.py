@@ -0,0 +1,99 @@
+from collections import Counter
+
+import component.parameter as param
+from .utils import get_running_loop
+
+__all__ = ["RenderScheduler", "get_render_scheduler"]
+
+
+class RenderScheduler:
+    """Coalesce the render requests of figures on the kernel event loop
+
+    A render requested while it's already pending is not scheduled again, so
+    a burst of trait changes within the delay triggers a single render, with
+    the last change of the burst. Without a running event loop (i.e. in a
+    script), renders are executed right away.
+
+    Args:
+        delay (float): time (seconds) a render waits for other requests
+    """
+
+    def __init__(self, delay=None):
+
+        self.delay = param.render_delay if delay is None else delay
+
+        self.requested = Counter()
+        self.executed = Counter()
+
+        self._pending = {}
+
+    @staticmethod
+    def get_name(render):
+        """Return the counter name of a render function"""
+
+        owner = getattr(render, "__self__", None)
+        name = getattr(render, "__name__", repr(render))
+
+        return f"{type(owner).__name__}.{name}" if owner is not None else name
+
+    def request(self, render, change=None):
+        """Request a render, called with the change once the delay is over
+
+        Args:
+            render (callable): function (i.e. bound method) updating a figure
+            change (dict, optional): trait change that triggered the request
+        """
+
+        self.requested[self.get_name(render)] += 1
+
+        if render in self._pending:
+            self._pending[render]["change"] = change
+            return
+
+        loop = get_running_loop()
+        self._pending[render] = {"change": change}
+
+        if loop is None:
+            self.run(render)
+            return
+
+        self._pending[render]["handle"] = loop.call_later(self.delay, self.run, render)
+
+    def observer(self, render):
+        """Return a traitlets observer requesting the render on every change"""
+
+        return lambda change: self.request(render, change)
+
+    def run(self, render):
+        """Execute a pending render now"""
+
+        pending = self._pending.pop(render, None)
+
+        if pending is None:
+            return
+
+        if "handle" in pending:
+            pending["handle"].cancel()
+
+        self.executed[self.get_name(render)] += 1
+        render(pending["change"])
+
+    def flush(self):
+        """Execute all the pending renders now"""
+
+        for render in list(self._pending):
+            self.run(render)
+
+
+_render_scheduler = None
+
+
+def get_render_scheduler():
+    """Return the render scheduler shared by the dashboard"""
+
+    global _render_scheduler
+
+    if _render_scheduler is None:
+        _render_scheduler = RenderScheduler()
+
+    return _render_scheduler
@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+
+import component.parameter as param
+from .hybas import accumulate_upstream
+from .reduction import read_reduction
+
+__all__ = ["ZonalStats"]
+
+
+class ZonalStats:
+    """Forest change areas (ha) of catchments by GFC class, as a dense matrix
+
+    Basins are the rows and param.gfc_classes the columns of the matrix, the
+    basin labels and colors and the class groups and years are kept once in
+    side tables. Charts read small aggregated views, the long dataframe is
+    only built on demand (see to_frame).
+
+    Args:
+        hybas_ids (array): HYBAS_ID of every basin
+        areas (array): (basins, classes) areas, 0 for the missing classes
+        colors (list): color of every basin
+        present (array, optional): whether every class is found in the
+            reduction, the classes of non null area if None
+    """
+
+    def __init__(self, hybas_ids, areas, colors, present=None):
+
+        self.hybas_ids = np.asarray(hybas_ids, dtype=np.int64)
+        self.areas = np.asarray(areas, dtype=np.float64)
+        self.present = self.areas.any(axis=0) if present is None else present
+
+        self.basins = pd.DataFrame(
+            {"basin": self.hybas_ids.astype(str), "catch_color": list(colors)}
+        )
+
+        classes = np.array(param.gfc_classes)
+        self.classes = pd.DataFrame(
+            {
+                "variable": classes,
+                "group": [param.gfc_translation[c] for c in classes],
+                "year": np.where(classes <= param.gfc_max_year, classes + 2000, 0),
+            }
+        )
+
+        # integer code of the group of every class
+        self.group_names, self.group_codes = np.unique(
+            self.classes.group, return_inverse=True
+        )
+
+        # cumulative loss by year of every basin, the loss of any span of years
+        # is the difference of two of its columns (see loss_span)
+        loss = np.flatnonzero(self.classes.group == "loss")
+        order = np.argsort(self.classes.year.to_numpy()[loss], kind="stable")
+
+        self.loss_years = self.classes.year.to_numpy()[loss][order]
+        self.cumulative_loss = np.zeros((len(self.hybas_ids), len(loss) + 1))
+        np.cumsum(self.areas[:, loss[order]], axis=1, out=self.cumulative_loss[:, 1:])
+
+        self._rows = pd.Series(np.arange(len(self.hybas_ids)), index=self.basins.basin)
+        self._label_order = np.argsort(self.basins.basin.to_numpy(), kind="stable")
+
+    def __len__(self):
+        return len(self.hybas_ids)
+
+    @classmethod
+    def from_reduction(cls, result, get_colors):
+        """Build the statistics of a reduceRegions result grouped by class
+
+        Args:
+            result (dict|str|Path|file): reduction result, see cs.read_reduction
+            get_colors (callable): function returning the colors of basins from
+                their HYBAS_ID
+        """
+
+        hybas_ids, basins, codes, areas = read_reduction(result)
+
+        columns = np.full(max(param.gfc_classes) + 1, -1)
+        columns[param.gfc_classes] = np.arange(len(param.gfc_classes))
+
+        # basins without any group are dropped
+        features, rows = np.unique(basins, return_inverse=True)
+        cols = columns[codes]
+        if (cols < 0).any():
+            raise KeyError(f"Unknown GFC classes: {np.unique(codes[cols < 0])}")
+
+        matrix = np.zeros((len(features), len(param.gfc_classes)))
+        matrix[rows, cols] = areas
+
+        present = np.zeros(len(param.gfc_classes), dtype=bool)
+        present[cols] = True
+
+        hybas_ids = hybas_ids[features]
+
+        return cls(hybas_ids, matrix, get_colors(hybas_ids), present)
+
+    def accumulate(self, next_down):
+        """Return the statistics accumulated over all the upstream catchments
+        of every basin, see cs.accumulate_upstream
+
+        Args:
+            next_down (array): NEXT_DOWN of every basin
+        """
+
+        return ZonalStats(
+            self.hybas_ids,
+            accumulate_upstream(self.hybas_ids, next_down, self.areas),
+            self.basins.catch_color,
+            self.present,
+        )
+
+    def rows(self, basins=None):
+        """Return the matrix rows of the basins, sorted by label, all if None
+
+        Args:
+            basins (list): labels (str HYBAS_ID) of the basins
+        """
+
+        if basins is None:
+            return self._label_order
+
+        rows = self._rows.reindex([str(basin) for basin in basins]).dropna()
+        rows = rows.to_numpy(dtype=np.int64)
+
+        return rows[np.argsort(self.basins.basin.to_numpy()[rows], kind="stable")]
+
+    def columns(self, group=None, years=None):
+        """Return the mask of the classes of a group and, optionally, of the
+        loss years within [from, to]"""
+
+        mask = self.present.copy()
+
+        if group is not None:
+            mask &= (self.classes.group == group).to_numpy()
+
+        if years is not None:
+            year = self.classes.year.to_numpy()
+            mask &= (year >= years[0]) & (year <= years[1])
+
+        return mask
+
+    def group_totals(self):
+        """Return the total area and the color of every group (overall pie)"""
+
+        totals = np.bincount(
+            self.group_codes[self.present],
+            weights=self.areas[:, self.present].sum(axis=0),
+            minlength=len(self.group_names),
+        )
+        groups = np.unique(self.group_codes[self.present])
+
+        return pd.DataFrame(
+            {
+                "group": self.group_names[groups],
+                "area": totals[groups],
+                "color": [param.gfc_colors_dict[g] for g in self.group_names[groups]],
+            }
+        )
+
+    def basin_totals(self, basins=None, group=None, years=None):
+        """Return the area of the classes of a group (all if None) of every
+        basin, with its color (catchment pie and bars)
+
+        Args:
+            basins (list, optional): labels of the basins, all if None
+            group (str, optional): group of the classes
+            years (list, optional): [from, to] span of the loss years
+        """
+
+        rows = self.rows(basins)
+
+        if group == "loss" and years is not None:
+            areas = self.loss_span(rows, years)
+        else:
+            areas = self.areas[rows][:, self.columns(group, years)].sum(axis=1)
+
+        df = self.basins.iloc[rows].reset_index(drop=True)
+        df.insert(1, "area", areas)
+
+        return df
+
+    def loss_span(self, rows, years):
+        """Return the loss area of the given rows within [from, to] years, from
+        the cumulative loss"""
+
+        start = np.searchsorted(self.loss_years, years[0], side="left")
+        stop = np.searchsorted(self.loss_years, years[1], side="right")
+
+        return self.cumulative_loss[rows, stop] - self.cumulative_loss[rows, start]
+
+    def trend(self, basins=None, years=None):
+        """Return the loss area of every basin (rows) and year (columns)
+
+        Args:
+            basins (list, optional): labels of the basins, all if None
+            years (list, optional): [from, to] span of the loss years
+        """
+
+        rows = self.rows(basins)
+        columns = self.columns("loss", years)
+
+        return pd.DataFrame(
+            self.areas[rows][:, columns],
+            index=self.basins.basin.iloc[rows],
+            columns=self.classes.year[columns],
+        )
+
+    def colors(self, basins=None):
+        """Return the color of the basins by label"""
+
+        basins = self.basins.iloc[self.rows(basins)]
+
+        return basins.catch_color.set_axis(basins.basin)
+
+    def to_frame(self):
+        """Return the long dataframe (basin, variable, area, group, year,
+        catch_color) with a row per basin and class found in the reduction"""
+
+        columns = np.flatnonzero(self.present)
+        rows = np.arange(len(self))
+
+        df = pd.concat(
+            [
+                self.basins.iloc[np.tile(rows, len(columns))].reset_index(drop=True),
+                self.classes.iloc[np.repeat(columns, len(rows))].reset_index(drop=True),
+            ],
+            axis=1,
+        )
+        df.insert(2, "area", self.areas[:, columns].T.ravel())
+
+        return df[["basin", "variable", "area", "group", "year", "catch_color"]]
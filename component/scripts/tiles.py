@@ -0,0 +1,156 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from shapely.geometry import box
+
+import component.parameter as param
+from .cache import LRUCache
+
+__all__ = ["CatchmentTileServer", "get_tile_server"]
+
+# half size of the web mercator world (meters)
+ORIGIN = 20037508.342789244
+
+
+class CatchmentTileServer:
+    """In-process Mapbox vector tile service of the loaded catchments
+
+    The catchments of a CatchmentStore are projected once in web mercator,
+    then every requested tile is cut from the STRtree candidates, simplified
+    to the tile resolution, encoded as MVT and cached by (z, x, y). The store
+    version is part of the url so the browser never mixes two delineations.
+
+    Args:
+        port (int): local port of the http server, 0 for a free one
+        cache_size (int): maximum number of encoded tiles kept in memory
+    """
+
+    def __init__(self, port=0, cache_size=None):
+
+        self.port = port
+        self.version = 0
+
+        self._gdf = None
+        self._tiles = LRUCache("tiles", cache_size or param.tile_cache_size, 0)
+        self._server = None
+
+    def set_store(self, store):
+        """Serve the catchments of the given CatchmentStore"""
+
+        self._gdf = store.gdf[["HYBAS_ID", "geometry"]].to_crs(epsg=3857)
+
+        # build the spatial index now rather than on the first tile request
+        self._gdf.sindex
+        self._tiles.clear()
+        self.version += 1
+
+    @property
+    def url(self):
+        """str: url template of the tiles, usable by a leaflet vector tile layer"""
+
+        # prefix of the Jupyter server, set by JupyterHub (i.e. on SEPAL)
+        prefix = os.environ.get("JUPYTERHUB_SERVICE_PREFIX", "/").rstrip("/") + "/"
+        base_url = param.tile_server_url.format(base_url=prefix, port=self.port)
+
+        return f"{base_url}/{self.version}/{{z}}/{{x}}/{{y}}.pbf"
+
+    def get_tile(self, z, x, y):
+        """Return the encoded MVT bytes of the tile"""
+
+        # local import, the encoder is only needed when tiles are served
+        import mapbox_vector_tile
+
+        key = [self.version, z, x, y]
+        tile = self._tiles.get(key)
+
+        if tile is not None:
+            return tile
+
+        size = 2 * ORIGIN / 2**z
+        bounds = (
+            -ORIGIN + x * size,
+            ORIGIN - (y + 1) * size,
+            -ORIGIN + (x + 1) * size,
+            ORIGIN - y * size,
+        )
+
+        # a few tile pixels over the border to avoid seams between tiles
+        pixel = size / param.tile_extent
+        clip = box(*bounds).buffer(pixel * param.tile_buffer, join_style=2)
+
+        rows = self._gdf.sindex.query(clip, predicate="intersects")
+        features = [
+            {"geometry": geom, "properties": {"HYBAS_ID": int(hybas_id)}}
+            for hybas_id, geom in self._gdf.iloc[rows].itertuples(index=False)
+        ]
+
+        for feature in features:
+            feature["geometry"] = feature["geometry"].intersection(clip).simplify(pixel)
+
+        tile = mapbox_vector_tile.encode(
+            [{"name": param.tile_layer_name, "features": features}],
+            default_options={
+                "quantize_bounds": bounds,
+                "extents": param.tile_extent,
+            },
+        )
+
+        self._tiles.set(key, tile)
+
+        return tile
+
+    def start(self):
+        """Start the http server in a daemon thread, if it's not running yet"""
+
+        if self._server:
+            return self
+
+        tile_server = self
+
+        class TileHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+
+                try:
+                    _, z, x, y = self.path.strip("/").split("/")
+                    tile = tile_server.get_tile(int(z), int(x), int(y.split(".")[0]))
+                except Exception:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(tile)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), TileHandler)
+        self.port = self._server.server_address[1]
+
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+        return self
+
+    def stop(self):
+        """Stop the http server"""
+
+        if self._server:
+            self._server.shutdown()
+            self._server = None
+
+
+_tile_server = None
+
+
+def get_tile_server():
+    """Return the (started) tile server shared by the session"""
+
+    global _tile_server
+
+    if _tile_server is None:
+        _tile_server = CatchmentTileServer().start()
+
+    return _tile_server
@@ -0,0 +1,69 @@
+import numpy as np
+
+__all__ = ["TraceReconciler"]
+
+
+def same(old, new):
+    """Return whether a trace property already has the new value"""
+
+    if new is None or np.isscalar(new):
+        return old == new
+
+    if old is None or isinstance(old, str) or len(old) != len(new):
+        return False
+
+    return np.array_equal(np.asarray(old, dtype=object), np.asarray(new, dtype=object))
+
+
+class TraceReconciler:
+    """Keep the traces of a figure keyed by name and only send what changed
+
+    On every reconcile, the traces that aren't wanted anymore are removed,
+    the missing ones are added and the existing ones only receive the
+    properties whose value changed. Call it within the figure batch_update
+    to send the updates in a single message.
+
+    Args:
+        figure (go.FigureWidget): figure of the traces
+        get_trace (callable): function returning a new trace from its properties
+    """
+
+    def __init__(self, figure, get_trace):
+
+        self.figure = figure
+        self.get_trace = get_trace
+
+        self.updates = 0
+        self.skipped = 0
+
+    def reconcile(self, traces):
+        """Set the traces of the figure
+
+        Args:
+            traces (dict): properties of every trace by name (i.e. the basin),
+                None being the name of an unnamed trace
+        """
+
+        if any(trace.name not in traces for trace in self.figure.data):
+            self.figure.data = [t for t in self.figure.data if t.name in traces]
+
+        current = {trace.name: trace for trace in self.figure.data}
+
+        for name, properties in traces.items():
+
+            if name not in current:
+                self.figure.add_trace(self.get_trace(name=name, **properties))
+                continue
+
+            trace = current[name]
+            changed = {
+                key: value
+                for key, value in properties.items()
+                if not same(trace[key], value)
+            }
+
+            self.updates += len(changed)
+            self.skipped += len(properties) - len(changed)
+
+            if changed:
+                trace.update(changed)
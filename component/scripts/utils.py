@@ -1,3 +1,4 @@
+import asyncio
 import random
 import ee
 from ipyleaflet import Marker
@@ -14,6 +15,15 @@ def get_hydroshed(level):
     return ee.FeatureCollection(param.hybas_dataset.format(level))
 
 
+def get_running_loop():
+    """Return the running event loop (i.e. the kernel one), None in a script"""
+
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
 def get_random_color():
     return "#{:06x}".format(random.randint(0, 0xFFFFFF))
 
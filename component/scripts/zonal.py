@@ -0,0 +1,133 @@
+import heapq
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+
+import component.parameter as param
+
+__all__ = ["split_chunks", "reduce_chunks"]
+
+
+def split_chunks(hybas_ids, areas=None, chunk_size=None, chunk_area=None):
+    """Split the basins in batches balanced by number of features and area
+
+    The number of batches starts at the one needed to respect both the
+    maximum number of features and the maximum area per batch, basins are
+    then dispatched from the largest to the smallest in the lightest batch
+    that isn't full yet. A new batch is opened when the basin doesn't fit in
+    any of them, a basin larger than chunk_area being alone in its batch.
+
+    Args:
+        hybas_ids (list): HYBAS_ID(s) to split
+        areas (list, optional): area of every basin (km²)
+        chunk_size (int): maximum number of basins per batch
+        chunk_area (float): maximum area per batch (km²)
+
+    Returns:
+        list: HYBAS_ID lists, each of them following the input order
+    """
+
+    chunk_size = chunk_size or param.stats_chunk_size
+    chunk_area = chunk_area or param.stats_chunk_area
+    areas = list(areas) if areas is not None else [0] * len(hybas_ids)
+
+    n_chunks = max(
+        math.ceil(len(hybas_ids) / chunk_size),
+        math.ceil(sum(areas) / chunk_area),
+        1,
+    )
+    n_chunks = min(n_chunks, max(len(hybas_ids), 1))
+
+    heap = [(0, 0, i) for i in range(n_chunks)]
+    chunks = [[] for _ in range(n_chunks)]
+
+    for pos in sorted(range(len(hybas_ids)), key=lambda i: -areas[i]):
+
+        # full batches leave the heap, a new one is opened when all are full
+        while heap and heap[0][1] >= chunk_size:
+            heapq.heappop(heap)
+
+        # the lightest batch is the only candidate for the area
+        if heap and (heap[0][1] == 0 or heap[0][0] + areas[pos] <= chunk_area):
+            area, size, i = heapq.heappop(heap)
+        else:
+            area, size, i = 0, 0, len(chunks)
+            chunks.append([])
+
+        chunks[i].append(pos)
+        heapq.heappush(heap, (area + areas[pos], size + 1, i))
+
+    return [[hybas_ids[pos] for pos in sorted(chunk)] for chunk in chunks if chunk]
+
+
+def is_retryable(error):
+    """Return whether a failed batch may succeed again or once split, i.e. an
+    Earth Engine timeout or memory error, see param.stats_retry_errors"""
+
+    message = str(error).lower()
+
+    return isinstance(error, ee.EEException) and any(
+        pattern in message for pattern in param.stats_retry_errors
+    )
+
+
+def reduce_chunks(
+    hybas_ids, reducer, areas=None, max_workers=None, retries=None, **chunk_kwargs
+):
+    """Run a zonal reduction by batches on a bounded thread pool
+
+    Every batch failing with a timeout or memory error (see is_retryable) is
+    retried independently and, when it keeps failing, split in two halves
+    reduced separately. Any other error is raised right away. The partial
+    results are merged in a single feature collection dict, in the order of
+    the given ids.
+
+    Args:
+        hybas_ids (list): HYBAS_ID(s) to reduce
+        reducer (callable): function taking a list of HYBAS_ID(s) and
+            returning a feature collection dict (i.e. reduceRegions getInfo)
+        areas (list, optional): area of every basin, to balance the batches
+        max_workers (int): maximum number of concurrent batches
+        retries (int): number of retries of a batch before splitting it
+        chunk_kwargs: chunk_size and chunk_area arguments of split_chunks
+    """
+
+    max_workers = max_workers or param.stats_max_workers
+    retries = param.stats_retries if retries is None else retries
+
+    def reduce_chunk(chunk):
+
+        for attempt in range(retries + 1):
+            try:
+                return reducer(chunk)["features"]
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                error = e
+                if attempt < retries:
+                    time.sleep(param.stats_retry_delay * (attempt + 1))
+
+        if len(chunk) == 1:
+            raise error
+
+        half = len(chunk) // 2
+
+        return reduce_chunk(chunk[:half]) + reduce_chunk(chunk[half:])
+
+    chunks = split_chunks(hybas_ids, areas, **chunk_kwargs)
+
+    if not chunks:
+        return {"type": "FeatureCollection", "features": []}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        results = list(executor.map(reduce_chunk, chunks))
+
+    position = {hybas_id: i for i, hybas_id in enumerate(hybas_ids)}
+    features = sorted(
+        (feature for result in results for feature in result),
+        key=lambda feature: position[feature["properties"]["HYBAS_ID"]],
+    )
+
+    return {"type": "FeatureCollection", "features": features}
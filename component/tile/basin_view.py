@@ -56,20 +56,51 @@ class BasinView(cw.Card):
             chips=True,
         ).hide()
 
+        self.w_progressive = v.Switch(
+            label=cm.basin.progressive,
+            v_model=False,
+            dense=True,
+        )
+
+        self.w_histogram = v.Switch(
+            label=cm.basin.histogram,
+            v_model=False,
+            dense=True,
+        )
+
         self.btn = sw.Btn(
             "Calculate statistics",
             small=True,
         )
 
-        self.children = [title, desc, self.w_type, self.w_hybasid, self.btn, self.alert]
+        self.children = [
+            title,
+            desc,
+            self.w_type,
+            self.w_hybasid,
+            self.w_progressive,
+            self.w_histogram,
+            self.btn,
+            self.alert,
+        ]
 
         self.model.observe(self.fill_catchs, "hybasin_list")
+        self.model.observe(self.stats_alert, "stats_status")
 
         self.w_hybasid.observe(self.zoom_to_selected, "v_model")
         self.w_type.observe(self.display_filter, "v_model")
 
         link((self.w_hybasid, "v_model"), (self.model, "selected_hybas"))
         link((self.w_type, "v_model"), (self.model, "method"))
+        link((self.w_progressive, "v_model"), (self.model, "stats_progressive"))
+        link(
+            (self.w_histogram, "v_model"),
+            (self.model, "stats_mode"),
+            transform=(
+                lambda histogram: "histogram" if histogram else "direct",
+                lambda mode: mode == "histogram",
+            ),
+        )
 
         self.btn.on_event("click", self.calculate_statistics)
 
@@ -89,14 +120,31 @@ class BasinView(cw.Card):
     def calculate_statistics(self, widget, event, data):
         """Calculate zonal statistics based on the selected hybas_id"""
 
-        self.model.ready = False
+        if not self.model.compute_statistics():
+            self.alert.add_msg(cm.basin.export, type_="info")
 
-        zonal_statistics = self.model.calculate_statistics()
+    def stats_alert(self, change):
+        """Notify the end of the statistics computed in the background, by an
+        export task or by the refinement of a preview"""
 
-        self.model.zonal_df = self.model.get_dataframe(zonal_statistics)
+        if change["new"] == "refining":
+            self.alert.add_msg(cm.basin.preview, type_="info")
+            return
+
+        if change["old"] == "refining":
+            if change["new"] == "done":
+                self.alert.add_msg(cm.basin.refine_done, type_="success")
+            elif change["new"] == "error":
+                self.alert.add_msg(cm.basin.refine_error, type_="error")
+            return
+
+        if not self.model.poller:
+            return
 
-        # Graphs dashboard is listening this trait to load its data
-        self.model.ready = True
+        if change["new"] == "done":
+            self.alert.add_msg(cm.basin.export_done, type_="success")
+        elif change["new"] == "error":
+            self.alert.add_msg(cm.basin.export_error, type_="error")
 
     def fill_catchs(self, change):
         """Fill the selection widget list with the gathered"""
@@ -116,7 +164,7 @@ class BasinView(cw.Card):
         else:
             # Get bounds and zoom to the object
             selected = self.model.get_selected(change["new"], from_json=True)
-            bounds = self.model.get_bounds(selected)
+            bounds = self.model.get_bounds(change["new"])
 
             selected = GeoJSON(
                 data=selected,
@@ -2,6 +2,7 @@ import ipyvuetify as v
 import sepal_ui.sepalwidgets as sw
 import component.tile as ct
 import component.widget as cw
+import component.scripts as cs
 
 
 __all__ = ["DashboardTile"]
@@ -56,8 +57,10 @@ class DashboardTile(sw.Layout):
         self.model.observe(self.update_traces, "ready")
     
     def update_traces(self,_):
-        """Update figures traces"""
+        """Request the update of the figures traces, coalesced with the
+        selection changes of the same burst (see cs.RenderScheduler)"""
         
-        self.overall_pie_card.update_pie_trace({"new":""})
-        self.detail_stat_layout.update_traces({"new":""})
+        scheduler = cs.get_render_scheduler()
+        scheduler.request(self.overall_pie_card.update_pie_trace, {"new":""})
+        scheduler.request(self.detail_stat_layout.update_traces, {"new":""})
         
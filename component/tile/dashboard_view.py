@@ -1,4 +1,3 @@
-import pandas as pd
 import plotly.graph_objects as go
 
 import ipyvuetify as v
@@ -31,6 +30,7 @@ class OverallPieCard(cw.Card):
         super().__init__(*args, **kwargs)
 
         self.model = model
+        self.scheduler = cs.get_render_scheduler()
         
         self.grouped_df = None
 
@@ -41,7 +41,9 @@ class OverallPieCard(cw.Card):
         self.children = [self.overall_pie_fig]
 
         # Events
-        self.model.observe(self.update_pie_trace, "selected_var")
+        self.model.observe(
+            self.scheduler.observer(self.update_pie_trace), "selected_var"
+        )
 
     def get_overall_pie(self, **pie_layout):
         """Create an overall pie chart."""
@@ -59,7 +61,7 @@ class OverallPieCard(cw.Card):
 
         def pull_pie_event(trace, points, state):
             
-            if self.model.zonal_df is None:
+            if self.model.stats is None:
                 return
             
             grouped_df = self.model.get_overall_pie_df()
@@ -76,7 +78,7 @@ class OverallPieCard(cw.Card):
 
         """
         
-        if self.model.zonal_df is None:
+        if self.model.stats is None:
             return
         
         selected_var = self.model.selected_var
@@ -114,6 +116,7 @@ class DetailedStat(sw.Layout):
         super().__init__(*args, **kwargs)
 
         self.model = model
+        self.scheduler = cs.get_render_scheduler()
         self.base_df_year = None
 
         self.catchment_bar_fig = self.get_catch_bar()
@@ -125,6 +128,12 @@ class DetailedStat(sw.Layout):
 
         self.trend_card = sw.Card(children=[self.trend_fig]).hide()
 
+        # traces of the detailed figures, by basin
+        self.bar_traces = cs.TraceReconciler(
+            self.catchment_bar_fig, self.get_catch_bar_trace
+        )
+        self.trend_traces = cs.TraceReconciler(self.trend_fig, self.get_trend_trace)
+
         self.children = [
             v.Layout(
                 class_="d-flex flex-wrap mb-2",
@@ -161,10 +170,11 @@ class DetailedStat(sw.Layout):
             ),
         ]
 
-        # Events
-        self.model.observe(self.update_traces, "selected_hybasid_chart")
-        self.model.observe(self.update_traces, "selected_var")
-        self.model.observe(self.update_traces, "sett_timespan")
+        # Events, bursts of changes are rendered once
+        self.model.observe(
+            self.scheduler.observer(self.update_traces),
+            ["selected_hybasid_chart", "selected_var", "sett_timespan", "sett_upstream"],
+        )
 
     @staticmethod
     def get_trend_fig(**trend_layout_style):
@@ -224,141 +234,86 @@ class DetailedStat(sw.Layout):
 
         return catchment_pie_fig
 
-    def add_color(self, dst_df):
-        """Add catchment color palette to a filtered dataframe. Useful when the 
-        dataframe has been grouped by any other variable and the color is lost."""
-
-        # if the color is already in the dataframe, remove it
-        if "catch_color" in dst_df.columns:
-            dst_df = dst_df.drop("catch_color", axis=1)
-
-        return pd.merge(
-            dst_df,
-            self.model.zonal_df.groupby(["basin"]).first()[["catch_color"]].reset_index(),
-            on="basin",
-            how="inner",
-        )
-
     def update_traces(self, _):
         """Update catchment pie and bar chart based on variable/catchment selected"""
         
         # Do nothing if the statistics are not calculated
-        if self.model.zonal_df is None:
+        if self.model.stats is None:
             return
 
         # Index model variables with short name
-        base_df = self.model.zonal_df
         selected_var = self.model.selected_var
-        hybas_id = self.model.selected_hybasid_chart
-        from_, to = self.model.sett_timespan
 
-        base_df = base_df[base_df.basin.isin(hybas_id)]
+        # memoized area of the selected variable by basin
+        basin_df = self.model.get_basin_df()
         
-        if selected_var == "all":
-
-            base_df = self.add_color(base_df.groupby(["basin"]).sum().reset_index())
-
-            # Filter by hybas_id with all the variables
-            labels = base_df["basin"]
-            values = base_df["area"]
-            colors = base_df["catch_color"]
-            
-            self.trend_card.hide()
-            self.catchment_bar_fig.update_traces(
-                x=labels, y=values, text=values, marker_color=colors
-            )
-        elif selected_var == "loss":
-
-            self.trend_card.show()
-
-            df = base_df.query(f"year>={from_}&year<={to}")
-
-            df_for_pie = self.add_color(
-                df[df.group == "loss"].groupby(["basin", "group"]).sum().reset_index()
-            )
+        labels, values, colors = (
+            basin_df["basin"],
+            basin_df["area"],
+            basin_df["catch_color"],
+        )
 
-            labels, values, colors = (
-                df_for_pie["basin"],
-                df_for_pie["area"],
-                df_for_pie["catch_color"],
-            )
-            self.catchment_bar_fig.update_layout(barmode="stack")
-
-            with (
-                self.catchment_bar_fig.batch_update() and 
-                self.trend_fig.batch_update()
-            ):
-
-                self.catchment_bar_fig.pop("data")
-                self.trend_fig.pop("data")
-                
-                
-
-                for basin in df.basin.unique().tolist():
-
-                    x = df[df.basin == basin]["year"]
-                    y = df[df.basin == basin]["area"]
-                    name = basin
-                    marker_color = df[df.basin == basin]["catch_color"]
-                    self.catchment_bar_fig.add_trace(
-                        self.get_catch_bar_trace(
-                            x=x, y=y, name=name, marker_color=marker_color
-                        )
-                    )
-                    
-                    self.trend_fig.add_trace(
-                        self.get_trend_trace(
-                            x=x, 
-                            y=y, 
-                            name=name, 
-                            marker_color=marker_color.unique().tolist()*len(x),
-                            line_color=marker_color.unique().tolist()[0]
-                        )
-                    )
-        else:
-            self.trend_card.hide()
+        # Only the changed traces and properties are sent, in a single
+        # message per figure
+        with (
+            self.catchment_bar_fig.batch_update(),
+            self.trend_fig.batch_update(),
+            self.catchment_pie_fig.batch_update(),
+        ):
+
+            if selected_var == "loss":
+
+                self.trend_card.show()
+                self.catchment_bar_fig.update_layout(barmode="stack")
+
+                trend_df = self.model.get_trend_df()
+                basin_colors = self.model.get_basin_colors()
+
+                # one bar and one trend trace per basin
+                traces = {
+                    basin: {
+                        "x": trend_df.columns,
+                        "y": trend_df.loc[basin],
+                        "marker_color": basin_colors[basin],
+                    }
+                    for basin in trend_df.index
+                }
+
+                self.bar_traces.reconcile(traces)
+                self.trend_traces.reconcile(
+                    {
+                        basin: dict(trace, line_color=trace["marker_color"])
+                        for basin, trace in traces.items()
+                    }
+                )
+            else:
+                self.trend_card.hide()
+
+                # a single trace with a bar per basin
+                self.bar_traces.reconcile(
+                    {
+                        None: {
+                            "x": labels,
+                            "y": values,
+                            "text": values,
+                            "marker_color": colors,
+                        }
+                    }
+                )
 
-            filtered_df = self.add_color(
-                base_df[base_df.group == selected_var]
-                .groupby(["basin", "group"])
-                .sum()
-                .reset_index()
+            self.catchment_pie_fig.update_traces(
+                labels=labels, values=values, marker_colors=colors
             )
 
-            labels, values, colors = (
-                filtered_df["basin"],
-                filtered_df["area"],
-                filtered_df["catch_color"],
+            # Update layouts title
+            # I will use eval to avoid create a translation transition
+            self.catchment_pie_fig.update_layout(
+                title_text=eval(f"cm.graphs.detail_pie.{selected_var}")
             )
-
-            # Check if there is more than one trace
-            if len(self.catchment_bar_fig.data) > 1:
-
-                with self.catchment_bar_fig.batch_update():
-
-                    self.catchment_bar_fig.pop("data")
-                    self.catchment_bar_fig.add_trace(
-                        self.get_catch_bar_trace(
-                            x=labels, y=values, marker_color=colors, text=values
-                        )
-                    )
-            else:
-                self.catchment_bar_fig.update_traces(
-                    x=labels, y=values, text=values, marker_color=colors
-                )
-        self.catchment_pie_fig.update_traces(
-            labels=labels, values=values, marker_colors=colors
-        )
-
-        # Update layouts title
-        # I will use eval to avoid create a translation transition
-        self.catchment_pie_fig.update_layout(
-            title_text=eval(f"cm.graphs.detail_pie.{selected_var}")
-        )
-        self.catchment_bar_fig.update_layout(
-            title_text=eval(f"cm.graphs.bars.{selected_var}"),
-            xaxis_title=eval(
-                f"cm.graphs.bars.xaxis_{'year' if selected_var =='loss' else 'catch'}"
-            ),
-        )        
+            self.catchment_bar_fig.update_layout(
+                title_text=eval(f"cm.graphs.bars.{selected_var}"),
+                xaxis_title=eval(
+                    f"cm.graphs.bars.xaxis_{'year' if selected_var =='loss' else 'catch'}"
+                ),
+            )        
         
@@ -1,12 +1,13 @@
 from traitlets import Bool, link
 from ipywidgets import Layout
-from ipyleaflet import GeoJSON
+from ipyleaflet import GeoJSON, VectorTileLayer
 import ipyvuetify as v
 
 import sepal_ui.sepalwidgets as sw
 import sepal_ui.scripts.utils as su
 from sepal_ui.mapping import SepalMap
 
+import component.scripts as cs
 import component.scripts.utils as cu
 import component.parameter as param
 import component.widget as cw
@@ -81,6 +82,12 @@ class InputsView(cw.Card):
 
         self.btn.on_event("click", self.get_upstream)
 
+        self.upstream_layer = None
+        self.hover_layer = None
+        self.tolerance = None
+        self.map_.observe(self.refine_geometry, "zoom")
+        self.map_.on_interaction(self.hover_tiles)
+
     @su.loading_button()
     def get_upstream(self, *args):
         """Get the upstream catchments from the given coordinates"""
@@ -93,25 +100,31 @@ class InputsView(cw.Card):
         geometry = ee.Geometry.Point((self.model.lon, self.model.lat))
         self.model.get_upstream_basin_ids(geometry)
 
-        upstream_catch = self.model.get_upstream_fc()
+        # Start with the coarsest geometries, finer ones are loaded when zooming
+        self.tolerance = max(param.simplify_tolerances)
+        self.model.data = self.model.get_geojson(self.tolerance)
 
-        self.model.data = upstream_catch.getInfo()
+        # Large upstream catchments are served as vector tiles
+        if len(self.model.data["features"]) > param.vector_tile_threshold:
+            upstream_catch_gj = self.upstream_layer = self.get_tile_layer()
 
-        # Create GeoJSON ipyleaflet object
-        upstream_catch_gj = GeoJSON(
-            data=self.model.data,
-            name="Upstream catchment",
-            style={"fillOpacity": 0.1, "weight": 2},
-            hover_style=param.hover_style,
-        )
+        else:
+            # Create GeoJSON ipyleaflet object
+            upstream_catch_gj = self.upstream_layer = GeoJSON(
+                data=self.model.data,
+                name="Upstream catchment",
+                style={"fillOpacity": 0.1, "weight": 2},
+                hover_style=param.hover_style,
+            )
 
-        def update_info(feature, **kargs):
-            """Update map box and display feature properties"""
-            self.map_.metadata_table.update(feature["properties"])
+            def update_info(feature, **kargs):
+                """Update map box and display feature properties"""
+                self.map_.metadata_table.update(feature["properties"])
 
-        upstream_catch_gj.on_hover(update_info)
+            upstream_catch_gj.on_hover(update_info)
 
-        forest_change = self.model.get_gfc(upstream_catch.geometry()).set(param.gfc_vis)
+        aoi = self.model.get_aoi(self.tolerance)
+        forest_change = self.model.get_gfc(aoi).set(param.gfc_vis)
 
         # Get bounds and zoom to the object
         if not hasattr(self.map_, "legend"):
@@ -120,3 +133,71 @@ class InputsView(cw.Card):
         self.map_.zoom_bounds(self.model.get_bounds(self.model.data))
         self.map_.addLayer(forest_change, {}, "Forest change")
         self.map_.add_layer(upstream_catch_gj)
+
+        self.refine_geometry({"new": self.map_.zoom})
+
+    def refine_geometry(self, change):
+        """Swap the upstream catchments for finer geometries when zooming in"""
+
+        if self.upstream_layer is None or self.upstream_layer not in self.map_.layers:
+            return
+
+        tolerance = cs.get_tolerance(change["new"])
+
+        if tolerance >= self.tolerance:
+            return
+
+        self.tolerance = tolerance
+        self.model.data = self.model.get_geojson(tolerance)
+
+        if isinstance(self.upstream_layer, VectorTileLayer):
+            tile_server = cs.get_tile_server()
+            tile_server.set_store(self.model.store)
+            self.upstream_layer.url = tile_server.url
+        else:
+            self.upstream_layer.data = self.model.data
+
+    def get_tile_layer(self):
+        """Return a vector tile layer of the upstream catchments and the hover
+        layer that highlights the catchment under the cursor"""
+
+        tile_server = cs.get_tile_server()
+        tile_server.set_store(self.model.store)
+
+        self.hover_layer = GeoJSON(
+            data={"type": "FeatureCollection", "features": []},
+            name="Hover",
+            style=param.hover_style,
+        )
+        self.hover_layer.hybas_id = None
+        self.map_.add_layer(self.hover_layer)
+
+        return VectorTileLayer(
+            url=tile_server.url,
+            name="Upstream catchment",
+            vector_tile_layer_styles={param.tile_layer_name: param.tile_style},
+        )
+
+    def hover_tiles(self, **kwargs):
+        """Display and highlight the catchment under the cursor when the upstream
+        catchments are served as vector tiles"""
+
+        if kwargs.get("type") != "mousemove":
+            return
+
+        if not isinstance(self.upstream_layer, VectorTileLayer):
+            return
+
+        if self.upstream_layer not in self.map_.layers:
+            return
+
+        lat, lon = kwargs["coordinates"]
+        hybas_id = self.model.store.at(lon, lat)
+
+        if hybas_id is None or hybas_id == self.hover_layer.hybas_id:
+            return
+
+        self.hover_layer.hybas_id = hybas_id
+        hover_data = self.model.get_selected([hybas_id], from_json=True)
+        self.map_.metadata_table.update(hover_data["features"][0]["properties"])
+        self.hover_layer.data = hover_data
@@ -35,6 +35,11 @@ class StatSettingCard(cw.Card):
             ],
         )
         self.w_years = cw.DateSlider(v_model=self.model.sett_timespan).hide()
+        self.w_upstream = v.Switch(
+            label=cm.graphs.setting.w_upstream.label,
+            v_model=self.model.sett_upstream,
+            dense=True,
+        )
         self.w_hybasid = sw.Select(
             label=cm.basin.basinid.label,
             v_model=[],
@@ -49,6 +54,7 @@ class StatSettingCard(cw.Card):
             title,
             self.w_variable,
             self.w_hybasid,
+            self.w_upstream,
             self.w_years,
             rt,
         ]
@@ -56,6 +62,7 @@ class StatSettingCard(cw.Card):
         # Links
         link((self.w_variable, "v_model"), (self.model, "selected_var"))
         link((self.w_hybasid, "v_model"), (self.model, "selected_hybasid_chart"))
+        link((self.w_upstream, "v_model"), (self.model, "sett_upstream"))
 
         # UI Events
         self.w_variable.observe(self.show_years, "v_model")
@@ -95,7 +102,7 @@ class StatSettingCard(cw.Card):
 
     def fill_items(self, _):
         """Fill w_hybasid items once model.ready is True with the inputs step and select the
-        first five(5) elements (arbitrary)"""
+        first five(5) elements (arbitrary), unless the basins didn't change"""
         
         method = self.model.method
         if method == "all":
@@ -104,12 +111,22 @@ class StatSettingCard(cw.Card):
             inputs_selection = self.model.selected_hybas
         
         
-        # Convert into string to graphic purposes        
-        self.w_hybasid.items = [
+        # Convert into string to graphic purposes
+        items = [
             {"text": str(val), "value": str(val), "disabled": False, "index": idx}
             for idx, val in enumerate(inputs_selection)
         ]
 
+        # Upstream statistics are only available for complete upstream selections
+        self.w_upstream.disabled = not self.model.upstream_complete
+
+        # Keep the user selection when the statistics are updated for the same
+        # basins (refined statistics, new years or threshold in histogram mode)
+        values = [it["value"] for it in self.w_hybasid.items]
+        if self.w_hybasid.v_model and values == [it["value"] for it in items]:
+            return
+
+        self.w_hybasid.items = items
         self.w_hybasid.v_model = [it["value"] for it in self.w_hybasid.items[:5]]
             
 